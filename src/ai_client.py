@@ -3,113 +3,332 @@ AI客户端模块
 
 负责调用AI服务商API进行智能分析
 """
+import hashlib
 import json
-import time
-from typing import Dict, Any, Optional, List
+import os
+import tempfile
+from typing import Dict, Any, Generator, Iterator, Optional, List, Union
 from urllib.parse import urljoin
 
-import requests
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        """序列化为JSON字节串（orjson）"""
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        """序列化为JSON字节串（标准库回退）"""
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    _loads = json.loads
+
+
+# 系统提示词
+_SYSTEM_PROMPT = """你是一个网络安全分析专家，专门分析Windows网络连接日志。
+你的任务是分析提供的网络连接统计信息，识别潜在的安全风险和异常行为，并提供专业的安全建议。
+
+分析要点：
+1. 识别异常的网络连接模式
+2. 评估安全风险等级
+3. 指出可疑的网络行为
+4. 提供具体的安全建议"""
 
 
 class AIClient:
     """AI客户端基类"""
 
-    def __init__(self, api_key: str, config: Dict[str, Any]):
+    def __init__(self, api_key: str, config: Dict[str, Any], cache_dir: Optional[str] = None):
         """
         初始化AI客户端
 
         Args:
             api_key: API密钥
             config: AI服务商配置
+            cache_dir: AI响应缓存目录，为None时不使用缓存
         """
         self.api_key = api_key
+        self.cache_dir = cache_dir
         self.api_base = config.get('api_base', '')
         self.model = config.get('model', '')
         self.timeout = config.get('timeout', 30)
         self.max_retries = config.get('max_retries', 3)
 
-    def _call_api(self, messages: list) -> Optional[str]:
+        # 延迟导入：--no-ai 模式下无需加载requests
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # 重试交给传输层处理：仅对429/5xx及连接错误指数退避重试，并遵循Retry-After
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+
+        # 复用连接池，避免每次调用都重新建立TCP+TLS连接
+        self._session = requests.Session()
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def close(self) -> None:
+        """关闭底层HTTP会话，释放连接池"""
+        self._session.close()
+
+    def _post(self, messages: list, stream: bool = False):
         """
-        调用AI API（子类实现）
+        发送Chat Completions请求
 
         Args:
             messages: 消息列表
+            stream: 是否以SSE流式返回
 
         Returns:
-            AI响应内容
+            requests响应对象
         """
-        raise NotImplementedError("子类必须实现_call_api方法")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.7,
+        }
+        if stream:
+            payload["stream"] = True
+
+        return self._session.post(self.api_base, headers=headers, data=_dumps(payload),
+                                  timeout=self.timeout, stream=stream)
 
-    def _retry_call(self, messages: list) -> Optional[str]:
+    def _call_api(self, messages: list) -> str:
         """
-        带重试机制的API调用
+        调用AI API（各服务商均兼容OpenAI Chat Completions接口）
 
         Args:
             messages: 消息列表
 
         Returns:
-            AI响应内容，失败返回None
+            AI响应内容
         """
-        last_error = None
+        response = self._post(messages)
+        response.raise_for_status()
 
-        for attempt in range(self.max_retries):
-            try:
-                return self._call_api(messages)
-            except Exception as e:
-                last_error = e
-                if attempt < self.max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    print(f"API调用失败，{wait_time}秒后重试... (尝试 {attempt + 1}/{self.max_retries})")
-                    time.sleep(wait_time)
-
-        print(f"API调用失败: {last_error}")
-        return None
+        result = response.json()
+        return result['choices'][0]['message']['content']
 
-    def analyze_logs(self, analysis_result: Dict[str, Any]) -> Optional[str]:
+    def _stream_api(self, messages: list) -> Generator[str, None, bool]:
         """
-        分析日志，生成AI分析报告
+        以流式方式调用AI API，逐段产出生成的文本
 
         Args:
-            analysis_result: 基础统计分析结果
+            messages: 消息列表
+
+        Yields:
+            AI响应内容片段
 
         Returns:
-            AI生成的分析文本
+            响应是否完整结束（收到 [DONE] 且未因长度等原因截断，或 finish_reason 为 stop）
         """
-        if not self.api_key:
-            print("警告: 未配置API Key，跳过AI分析")
-            return None
+        finish_reason = None
+        with self._post(messages, stream=True) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                # SSE格式: "data: {...}"，以 "data: [DONE]" 结束
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    return finish_reason in (None, 'stop')
+
+                # 结构不符合预期的事件（非对象、choices/delta类型不对等）直接跳过
+                try:
+                    event = _loads(data)
+                except ValueError:
+                    continue
+                if not isinstance(event, dict):
+                    continue
+                choices = event.get('choices')
+                if not isinstance(choices, list) or not choices or not isinstance(choices[0], dict):
+                    continue
+                finish_reason = choices[0].get('finish_reason') or finish_reason
+                delta = choices[0].get('delta')
+                if not isinstance(delta, dict):
+                    continue
+                content = delta.get('content')
+                if content and isinstance(content, str):
+                    yield content
+
+        # 连接结束但未收到 [DONE]：只有明确 stop 时才算完整
+        return finish_reason == 'stop'
+
+    def _build_messages(self, analysis_result: Dict[str, Any]) -> list:
+        """
+        构造发送给AI的消息列表
 
-        # 构造提示词
-        prompt = self._build_prompt(analysis_result)
+        Args:
+            analysis_result: 基础统计分析结果
 
-        messages = [
+        Returns:
+            消息列表
+        """
+        return [
             {
                 "role": "system",
-                "content": """你是一个网络安全分析专家，专门分析Windows网络连接日志。
-你的任务是分析提供的网络连接统计信息，识别潜在的安全风险和异常行为，并提供专业的安全建议。
-
-分析要点：
-1. 识别异常的网络连接模式
-2. 评估安全风险等级
-3. 指出可疑的网络行为
-4. 提供具体的安全建议"""
+                "content": _SYSTEM_PROMPT
             },
             {
                 "role": "user",
-                "content": prompt
+                "content": self._build_prompt(analysis_result)
             }
         ]
 
+    def analyze_logs(self, analysis_result: Dict[str, Any],
+                     stream: bool = False) -> Optional[Union[str, Iterator[str]]]:
+        """
+        分析日志，生成AI分析报告
+
+        Args:
+            analysis_result: 基础统计分析结果
+            stream: 为True时返回文本片段迭代器，可在生成过程中逐段处理
+
+        Returns:
+            AI生成的分析文本（stream=True时为文本片段迭代器）
+        """
+        # 先检查API Key，未配置时不构造提示词和消息
+        if not self.api_key:
+            print("警告: 未配置API Key，跳过AI分析")
+            return None
+
+        messages = self._build_messages(analysis_result)
+
+        # 相同模型+相同提示词命中缓存时直接返回，不再调用API
+        cache_key = self._cache_key(messages)
+        cached = self._read_cache(cache_key)
+        if cached is not None:
+            print("命中AI分析缓存，跳过API调用")
+            return iter([cached]) if stream else cached
+
+        if stream:
+            return self._stream_logs(messages, cache_key)
+
         print("正在调用AI分析...")
-        response = self._retry_call(messages)
+        try:
+            # 传输层重试由HTTPAdapter完成；此处兜底所有异常（含响应结构异常），
+            # AI分析失败时报告仍照常生成，只是不含AI章节
+            response = self._call_api(messages)
+        except Exception as e:
+            print(f"API调用失败: {e}")
+            response = None
 
         if response:
             print("AI分析完成")
+            self._write_cache(cache_key, response)
         else:
             print("AI分析失败")
 
         return response
 
+    def _stream_logs(self, messages: list, cache_key: str) -> Iterator[str]:
+        """
+        流式AI分析，调用失败时打印错误并提前结束迭代
+
+        Args:
+            messages: 消息列表
+            cache_key: 缓存键，响应完整结束后才写入缓存（截断的响应不缓存）
+
+        Yields:
+            AI响应内容片段
+        """
+        print("正在调用AI分析...")
+        parts = []
+        completed = False
+        stream = self._stream_api(messages)
+        try:
+            while True:
+                try:
+                    content = next(stream)
+                except StopIteration as stop:
+                    completed = bool(stop.value)
+                    break
+                parts.append(content)
+                yield content
+        except Exception as e:
+            print(f"\nAPI调用失败: {e}")
+        finally:
+            stream.close()
+
+        if parts:
+            print("\nAI分析完成")
+            if completed:
+                self._write_cache(cache_key, "".join(parts))
+            else:
+                print("警告: AI响应未完整结束，结果不写入缓存")
+        else:
+            print("AI分析失败")
+
+    def _cache_key(self, messages: list) -> str:
+        """
+        计算响应缓存键（模型名+用户提示词的SHA-256）
+
+        Args:
+            messages: 消息列表
+
+        Returns:
+            十六进制缓存键
+        """
+        return hashlib.sha256((self.model + messages[-1]['content']).encode('utf-8')).hexdigest()
+
+    def _read_cache(self, cache_key: str) -> Optional[str]:
+        """
+        读取缓存的AI响应
+
+        Args:
+            cache_key: 缓存键
+
+        Returns:
+            缓存的响应文本，未启用缓存或未命中时返回None
+        """
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(os.path.join(self.cache_dir, f"{cache_key}.md"), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_cache(self, cache_key: str, response: str) -> None:
+        """
+        原子写入AI响应缓存（先写临时文件再替换）
+
+        Args:
+            cache_key: 缓存键
+            response: AI响应文本
+        """
+        if not self.cache_dir:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(response)
+                os.replace(tmp_path, os.path.join(self.cache_dir, f"{cache_key}.md"))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"警告: 写入AI分析缓存失败 - {e}")
+
     def _build_prompt(self, analysis_result: Dict[str, Any]) -> str:
         """
         构建AI分析的提示词
@@ -120,183 +339,126 @@ class AIClient:
         Returns:
             提示词字符串
         """
-        prompt = "请分析以下Windows网络连接日志的统计信息：\n\n"
+        parts = ["请分析以下Windows网络连接日志的统计信息：\n\n"]
 
         # 基础统计
-        prompt += "## 基础统计\n"
-        prompt += f"- 总连接数: {analysis_result['summary']['total_count']}\n"
-        prompt += f"- 唯一IP数: {analysis_result['summary']['unique_ips']}\n"
-        prompt += f"- 唯一用户数: {analysis_result['summary']['unique_users']}\n"
-        prompt += f"- 唯一进程数: {analysis_result['summary']['unique_processes']}\n\n"
+        summary = analysis_result['summary']
+        parts.append(
+            "## 基础统计\n"
+            f"- 总连接数: {summary['total_count']}\n"
+            f"- 唯一IP数: {summary['unique_ips']}\n"
+            f"- 唯一用户数: {summary['unique_users']}\n"
+            f"- 唯一进程数: {summary['unique_processes']}\n\n"
+        )
 
         # 时间分析
-        time_range = analysis_result['time_analysis']['time_range']
+        time_analysis = analysis_result['time_analysis']
+        time_range = time_analysis['time_range']
         if time_range.get('start'):
-            prompt += "## 时间分析\n"
-            prompt += f"- 时间范围: {time_range.get('start_str')} ~ {time_range.get('end_str')}\n"
-            prompt += f"- 持续时长: {time_range.get('duration_hours', 0):.2f} 小时\n"
-            prompt += f"- 异常时间连接: {analysis_result['time_analysis']['abnormal_time_count']} ({analysis_result['time_analysis']['abnormal_time_percentage']:.1f}%)\n\n"
+            parts.append(
+                "## 时间分析\n"
+                f"- 时间范围: {time_range.get('start_str')} ~ {time_range.get('end_str')}\n"
+                f"- 持续时长: {time_range.get('duration_hours', 0):.2f} 小时\n"
+                f"- 异常时间连接: {time_analysis['abnormal_time_count']} ({time_analysis['abnormal_time_percentage']:.1f}%)\n\n"
+            )
 
         # 进程分析
         proc = analysis_result['process_analysis']
-        prompt += "## 进程分析\n"
-        prompt += f"- 系统进程占比: {proc['system_percentage']:.1f}%\n"
-        if proc['top_processes']:
-            prompt += "- Top 5 活跃进程:\n"
-            for process, count in proc['top_processes'][:5]:
-                # 提取进程名
-                process_name = process.split('\\')[-1] if '\\' in process else process
-                prompt += f"  * {process_name}: {count} 次连接\n"
-        prompt += "\n"
+        parts.append(f"## 进程分析\n- 系统进程占比: {proc['system_percentage']:.1f}%\n")
+        if proc['top_processes_top5']:
+            parts.append("- Top 5 活跃进程:\n")
+            parts.append("".join(
+                f"  * {process_name}: {count} 次连接\n"
+                for process_name, count in proc['top_processes_top5']
+            ))
+        parts.append("\n")
 
         # IP分析
         ip = analysis_result['ip_analysis']
-        prompt += "## IP地址分析\n"
-        prompt += f"- 内网IP: {ip['internal_count']} ({ip['internal_percentage']:.1f}%)\n"
-        prompt += f"- 外网IP: {ip['external_count']} ({ip['external_percentage']:.1f}%)\n"
-        if ip['top_ips']:
-            prompt += "- Top 5 访问的IP:\n"
-            for ip_addr, count in ip['top_ips'][:5]:
-                prompt += f"  * {ip_addr}: {count} 次连接\n"
-        prompt += "\n"
+        parts.append(
+            "## IP地址分析\n"
+            f"- 内网IP: {ip['internal_count']} ({ip['internal_percentage']:.1f}%)\n"
+            f"- 外网IP: {ip['external_count']} ({ip['external_percentage']:.1f}%)\n"
+        )
+        if ip['top_ips_top5']:
+            parts.append("- Top 5 访问的IP:\n")
+            parts.append("".join(
+                f"  * {ip_addr}: {count} 次连接\n"
+                for ip_addr, count in ip['top_ips_top5']
+            ))
+        parts.append("\n")
 
         # 端口分析
         port = analysis_result['port_analysis']
-        prompt += "## 端口分析\n"
-        prompt += f"- 高危端口连接: {port['high_risk_port_count']} ({port['high_risk_port_percentage']:.1f}%)\n"
-        if port['top_ports']:
-            prompt += "- Top 5 访问端口:\n"
-            for port_num, count in port['top_ports'][:5]:
-                service = port['port_details'].get(port_num, {}).get('service', '未知')
-                prompt += f"  * 端口 {port_num} ({service}): {count} 次连接\n"
-        prompt += "\n"
+        parts.append(
+            "## 端口分析\n"
+            f"- 高危端口连接: {port['high_risk_port_count']} ({port['high_risk_port_percentage']:.1f}%)\n"
+        )
+        if port['top_ports_top5']:
+            port_details = port['port_details']
+            parts.append("- Top 5 访问端口:\n")
+            parts.append("".join(
+                f"  * 端口 {port_num} ({port_details.get(port_num, {}).get('service', '未知')}): {count} 次连接\n"
+                for port_num, count in port['top_ports_top5']
+            ))
+        parts.append("\n")
 
         # 用户分析
         user = analysis_result['user_analysis']
-        prompt += "## 用户分析\n"
-        prompt += f"- 特权账户连接: {user['privileged_count']} ({user['privileged_percentage']:.1f}%)\n"
-        if user['top_users']:
-            prompt += "- Top 5 用户:\n"
-            for username, count in user['top_users'][:5]:
-                prompt += f"  * {username}: {count} 次连接\n"
-        prompt += "\n"
+        parts.append(f"## 用户分析\n- 特权账户连接: {user['privileged_count']} ({user['privileged_percentage']:.1f}%)\n")
+        if user['top_users_top5']:
+            parts.append("- Top 5 用户:\n")
+            parts.append("".join(
+                f"  * {username}: {count} 次连接\n"
+                for username, count in user['top_users_top5']
+            ))
+        parts.append("\n")
 
         # 异常检测
         anomalies = analysis_result['anomalies']
-        prompt += "## 异常检测\n"
-        prompt += f"- 高危端口连接数: {len(anomalies['high_risk_port_connections'])}\n"
-        prompt += f"- 可疑进程数量: {len(anomalies['suspicious_process_ips'])}\n"
-        if anomalies['suspicious_process_ips']:
-            prompt += "- 可疑进程详情:\n"
-            for item in anomalies['suspicious_process_ips'][:3]:
-                process_name = item['process'].split('\\')[-1] if '\\' in item['process'] else item['process']
-                prompt += f"  * {process_name} 访问了 {item['external_ip_count']} 个不同外网IP\n"
-
-        prompt += "\n\n"
-        prompt += "请基于以上统计信息，提供:\n"
-        prompt += "1. 风险评估（低/中/高）\n"
-        prompt += "2. 发现的安全问题和异常\n"
-        prompt += "3. 具体的安全建议\n"
-        prompt += "4. 需要关注的事项\n"
-
-        return prompt
+        suspicious = anomalies['suspicious_process_ips']
+        parts.append(
+            "## 异常检测\n"
+            f"- 高危端口连接数: {len(anomalies['high_risk_port_connections'])}\n"
+            f"- 可疑进程数量: {len(suspicious)}\n"
+        )
+        if suspicious:
+            parts.append("- 可疑进程详情:\n")
+            parts.append("".join(
+                f"  * {item['process_name']} 访问了 {item['external_ip_count']} 个不同外网IP\n"
+                for item in suspicious[:3]
+            ))
+
+        parts.append(
+            "\n\n"
+            "请基于以上统计信息，提供:\n"
+            "1. 风险评估（低/中/高）\n"
+            "2. 发现的安全问题和异常\n"
+            "3. 具体的安全建议\n"
+            "4. 需要关注的事项\n"
+        )
+
+        return "".join(parts)
 
 
 class ZhipuAIClient(AIClient):
     """智谱AI客户端"""
 
-    def _call_api(self, messages: list) -> str:
-        """调用智谱AI API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-        }
-
-        response = requests.post(self.api_base, headers=headers, json=payload, timeout=self.timeout)
-        response.raise_for_status()
-
-        result = response.json()
-        return result['choices'][0]['message']['content']
-
 
 class QwenAIClient(AIClient):
     """阿里云Qwen客户端"""
 
-    def _call_api(self, messages: list) -> str:
-        """调用阿里云Qwen API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-        }
-
-        response = requests.post(self.api_base, headers=headers, json=payload, timeout=self.timeout)
-        response.raise_for_status()
-
-        result = response.json()
-        return result['choices'][0]['message']['content']
-
 
 class KimiAIClient(AIClient):
     """月之暗面Kimi客户端"""
 
-    def _call_api(self, messages: list) -> str:
-        """调用月之暗面Kimi API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-        }
-
-        response = requests.post(self.api_base, headers=headers, json=payload, timeout=self.timeout)
-        response.raise_for_status()
-
-        result = response.json()
-        return result['choices'][0]['message']['content']
-
 
 class OpenAIClient(AIClient):
     """OpenAI GPT客户端"""
 
-    def _call_api(self, messages: list) -> str:
-        """调用OpenAI API"""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-        }
 
-        response = requests.post(self.api_base, headers=headers, json=payload, timeout=self.timeout)
-        response.raise_for_status()
-
-        result = response.json()
-        return result['choices'][0]['message']['content']
-
-
-
-
-def get_ai_client(provider: str, api_key: str, config: Dict[str, Any]) -> Optional[AIClient]:
+def get_ai_client(provider: str, api_key: str, config: Dict[str, Any],
+                  cache_dir: Optional[str] = None) -> Optional[AIClient]:
     """
     根据提供商获取AI客户端
 
@@ -304,10 +466,16 @@ def get_ai_client(provider: str, api_key: str, config: Dict[str, Any]) -> Option
         provider: 提供商名称 (zhipu, qwen, kimi, openai)
         api_key: API密钥
         config: 提供商配置
+        cache_dir: AI响应缓存目录，为None时不使用缓存
 
     Returns:
-        AI客户端实例
+        AI客户端实例，未配置API Key或提供商不支持时返回None
     """
+    # 无API Key时不创建客户端，整个AI路径（包括requests导入）都不会执行
+    if not api_key:
+        print("警告: 未配置API Key，跳过AI分析")
+        return None
+
     client_map = {
         'zhipu': ZhipuAIClient,
         'qwen': QwenAIClient,
@@ -320,6 +488,6 @@ def get_ai_client(provider: str, api_key: str, config: Dict[str, Any]) -> Option
         print(f"错误: 不支持的AI提供商 - {provider}")
         return None
 
-    return client_class(api_key, config)
+    return client_class(api_key, config, cache_dir)
 
 
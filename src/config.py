@@ -4,9 +4,60 @@
 负责加载和管理应用程序配置
 """
 import os
-import yaml
 from pathlib import Path
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
+
+
+def _load_yaml(stream) -> Any:
+    """使用LibYAML加速的安全加载器解析YAML（不可用时回退到纯Python实现）"""
+    import yaml
+
+    return yaml.load(stream, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def _dump_yaml(data: Any, stream) -> None:
+    """使用LibYAML加速的安全输出器写入YAML（不可用时回退到纯Python实现）"""
+    import yaml
+
+    yaml.dump(data, stream, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper),
+              default_flow_style=False, allow_unicode=True, sort_keys=False)
+
+
+# 缓存中表示“尚未解析”的哨兵值
+_MISSING = object()
+
+# 默认AI提供商配置（只读，所有实例共享）
+_DEFAULT_PROVIDERS: Mapping[str, Mapping[str, Any]] = MappingProxyType({
+    'zhipu': MappingProxyType({
+        'name': '智谱AI',
+        'api_base': 'https://open.bigmodel.cn/api/paas/v4/chat/completions',
+        'model': 'glm-4',
+        'timeout': 30,
+        'max_retries': 3,
+    }),
+    'qwen': MappingProxyType({
+        'name': '阿里云Qwen',
+        'api_base': 'https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions',
+        'model': 'qwen-plus',
+        'timeout': 30,
+        'max_retries': 3,
+    }),
+    'kimi': MappingProxyType({
+        'name': '月之暗面Kimi',
+        'api_base': 'https://api.moonshot.cn/v1/chat/completions',
+        'model': 'moonshot-v1-8k',
+        'timeout': 30,
+        'max_retries': 3,
+    }),
+    'openai': MappingProxyType({
+        'name': 'OpenAI GPT',
+        'api_base': 'https://api.openai.com/v1/chat/completions',
+        'model': 'gpt-4o',
+        'timeout': 30,
+        'max_retries': 3,
+    }),
+})
 
 
 class Config:
@@ -21,6 +72,8 @@ class Config:
         """
         self.config_path = config_path or self._get_default_config_path()
         self.config = self._load_config()
+        # 点号键 -> 解析结果的缓存，update()/save()时清空
+        self._cache: Dict[str, Any] = {}
 
     def _get_default_config_path(self) -> str:
         """获取默认配置文件路径"""
@@ -48,7 +101,7 @@ class Config:
 
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+                config = _load_yaml(f)
                 return config if config else {}
         except Exception as e:
             print(f"错误: 加载配置文件失败 - {e}")
@@ -81,16 +134,31 @@ class Config:
         Returns:
             配置值
         """
-        keys = key.split('.')
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._resolve(key)
+            self._cache[key] = value
+
+        return default if value is None else value
+
+    def _resolve(self, key: str) -> Any:
+        """
+        按点号分隔的键逐层查找配置值
+
+        Args:
+            key: 配置键
+
+        Returns:
+            配置值，不存在时返回None
+        """
         value = self.config
 
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-            else:
-                return default
+        for k in key.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(k)
             if value is None:
-                return default
+                return None
 
         return value
 
@@ -143,6 +211,7 @@ class Config:
             config = config[k]
 
         config[keys[-1]] = value
+        self._cache.clear()
 
     def save(self, path: Optional[str] = None) -> None:
         """
@@ -152,13 +221,13 @@ class Config:
             path: 保存路径，默认为原配置文件路径
         """
         save_path = path or self.config_path
+        self._cache.clear()
         try:
             # 确保目录存在
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
             with open(save_path, 'w', encoding='utf-8') as f:
-                yaml.dump(self.config, f, default_flow_style=False,
-                          allow_unicode=True, sort_keys=False)
+                _dump_yaml(self.config, f)
             print(f"配置已保存到: {save_path}")
         except Exception as e:
             print(f"错误: 保存配置失败 - {e}")
@@ -189,53 +258,24 @@ class AIProvidersConfig:
                 return path
         return "config/ai_providers.yaml"
 
-    def _load_config(self) -> Dict[str, Any]:
+    def _load_config(self) -> Mapping[str, Any]:
         """加载AI提供商配置"""
         if not os.path.exists(self.config_path):
             return self._get_default_config()
 
         try:
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+                config = _load_yaml(f)
                 return config if config else {}
         except Exception as e:
             print(f"警告: 加载AI提供商配置失败 - {e}")
             return self._get_default_config()
 
-    def _get_default_config(self) -> Dict[str, Any]:
-        """获取默认AI提供商配置"""
-        return {
-            'zhipu': {
-                'name': '智谱AI',
-                'api_base': 'https://open.bigmodel.cn/api/paas/v4/chat/completions',
-                'model': 'glm-4',
-                'timeout': 30,
-                'max_retries': 3,
-            },
-            'qwen': {
-                'name': '阿里云Qwen',
-                'api_base': 'https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions',
-                'model': 'qwen-plus',
-                'timeout': 30,
-                'max_retries': 3,
-            },
-            'kimi': {
-                'name': '月之暗面Kimi',
-                'api_base': 'https://api.moonshot.cn/v1/chat/completions',
-                'model': 'moonshot-v1-8k',
-                'timeout': 30,
-                'max_retries': 3,
-            },
-            'openai': {
-                'name': 'OpenAI GPT',
-                'api_base': 'https://api.openai.com/v1/chat/completions',
-                'model': 'gpt-4o',
-                'timeout': 30,
-                'max_retries': 3,
-            }
-        }
+    def _get_default_config(self) -> Mapping[str, Any]:
+        """获取默认AI提供商配置（只读）"""
+        return _DEFAULT_PROVIDERS
 
-    def get_provider(self, provider_name: str) -> Optional[Dict[str, Any]]:
+    def get_provider(self, provider_name: str) -> Optional[Mapping[str, Any]]:
         """
         获取指定提供商的配置
 
@@ -3,14 +3,21 @@
 
 负责扫描目录，查找JSONL文件
 """
+import logging
 import os
+import stat
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
 
 
 class FileScanner:
     """文件扫描器"""
 
+    # JSONL文件扩展名（str.endswith直接接受元组）
+    JSONL_SUFFIXES = ('.jsonl',)
+
     def __init__(self, data_dir: Optional[str] = None):
         """
         初始化文件扫描器
@@ -30,37 +37,79 @@ class FileScanner:
         Returns:
             JSONL文件路径列表
         """
+        return self.paths(self.scan_directory_entries(directory))
+
+    def scan_directory_entries(self, directory: Optional[str] = None) -> List[Tuple[str, int]]:
+        """
+        扫描目录中的所有JSONL文件，并附带扫描时获取的文件大小
+
+        Args:
+            directory: 目录路径，默认为初始化时指定的目录
+
+        Returns:
+            (文件路径, 文件大小字节数)列表，按文件名（其次完整路径）排序
+        """
         scan_dir = directory or self.data_dir
 
         if not os.path.exists(scan_dir):
-            print(f"警告: 目录不存在 - {scan_dir}")
+            logger.warning("警告: 目录不存在 - %s", scan_dir)
             return []
 
-        jsonl_files = []
+        jsonl_entries = []
 
         try:
-            # 递归扫描所有.jsonl文件
-            for root, dirs, files in os.walk(scan_dir):
-                for file in files:
-                    if file.endswith('.jsonl'):
-                        file_path = os.path.join(root, file)
-                        jsonl_files.append(file_path)
-
-            if not jsonl_files:
-                print(f"提示: 目录中未找到JSONL文件 - {scan_dir}")
+            # 递归扫描所有.jsonl文件，文件大小取自目录遍历时的stat结果
+            # 按(文件名, 路径)排序，文件名直接取自DirEntry，无需再调用os.path.basename
+            jsonl_entries = [
+                (file_path, size_bytes)
+                for _, file_path, size_bytes in sorted(self._iter_jsonl(scan_dir))
+            ]
+
+            if not jsonl_entries:
+                logger.info("提示: 目录中未找到JSONL文件 - %s", scan_dir)
             else:
-                print(f"找到 {len(jsonl_files)} 个JSONL文件:")
-                for file_path in jsonl_files:
-                    file_size = Path(file_path).stat().st_size / 1024  # KB
-                    print(f"  - {file_path} ({file_size:.2f} KB)")
+                logger.info("找到 %d 个JSONL文件", len(jsonl_entries))
+                for file_path, size_bytes in jsonl_entries:
+                    logger.debug("  - %s (%.2f KB)", file_path, size_bytes / 1024)
 
         except Exception as e:
-            print(f"错误: 扫描目录失败 - {e}")
+            logger.error("错误: 扫描目录失败 - %s", e)
+
+        return jsonl_entries
+
+    @staticmethod
+    def paths(entries: Iterable[Tuple[str, int]]) -> List[str]:
+        """
+        从扫描结果中提取文件路径
+
+        Args:
+            entries: (文件路径, 文件大小字节数)列表
 
-        # 按文件名排序
-        jsonl_files.sort()
+        Returns:
+            文件路径列表
+        """
+        return [file_path for file_path, _ in entries]
+
+    def _iter_jsonl(self, directory: str) -> Iterator[Tuple[str, str, int]]:
+        """
+        递归遍历目录，产出JSONL文件名、路径及其大小
 
-        return jsonl_files
+        Args:
+            directory: 目录路径
+
+        Yields:
+            (文件名, 文件路径, 文件大小字节数)
+        """
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from self._iter_jsonl(entry.path)
+                    elif entry.name.endswith(self.JSONL_SUFFIXES) and entry.is_file():
+                        yield entry.name, entry.path, entry.stat().st_size
+        except OSError as e:
+            # 与os.walk一致：无法访问的子目录直接跳过
+            logger.warning("警告: 无法读取目录 %s - %s", directory, e)
 
     def scan_single_file(self, file_path: str) -> Optional[str]:
         """
@@ -72,16 +121,17 @@ class FileScanner:
         Returns:
             文件路径（如果存在），否则返回None
         """
-        if not os.path.exists(file_path):
-            print(f"错误: 文件不存在 - {file_path}")
+        try:
+            file_size = os.path.getsize(file_path) / 1024  # KB
+        except OSError:
+            logger.error("错误: 文件不存在 - %s", file_path)
             return None
 
-        if not file_path.endswith('.jsonl'):
-            print(f"警告: 文件不是JSONL格式 - {file_path}")
+        if not file_path.endswith(self.JSONL_SUFFIXES):
+            logger.warning("警告: 文件不是JSONL格式 - %s", file_path)
             # 仍然返回，让解析器去处理
 
-        file_size = Path(file_path).stat().st_size / 1024  # KB
-        print(f"找到文件: {file_path} ({file_size:.2f} KB)")
+        logger.info("找到文件: %s (%.2f KB)", file_path, file_size)
 
         return file_path
 
@@ -95,52 +145,59 @@ class FileScanner:
         Returns:
             文件信息字典
         """
-        if not os.path.exists(file_path):
+        # 一次stat调用获取全部信息
+        try:
+            st = os.stat(file_path)
+        except OSError:
             return {
                 'exists': False,
                 'path': file_path,
             }
 
         path = Path(file_path)
-        stat = path.stat()
 
         return {
             'exists': True,
             'path': str(path),
             'name': path.name,
-            'size_bytes': stat.st_size,
-            'size_kb': stat.st_size / 1024,
-            'size_mb': stat.st_size / (1024 * 1024),
-            'is_file': path.is_file(),
-            'is_jsonl': file_path.endswith('.jsonl'),
+            'size_bytes': st.st_size,
+            'size_kb': st.st_size / 1024,
+            'size_mb': st.st_size / (1024 * 1024),
+            'is_file': stat.S_ISREG(st.st_mode),
+            'is_jsonl': file_path.endswith(self.JSONL_SUFFIXES),
         }
 
-    def filter_by_size(self, file_paths: List[str], max_size_mb: float) -> List[str]:
+    def filter_by_size(self, files: Iterable[Union[str, Tuple[str, int]]],
+                       max_size_mb: float) -> Iterator[str]:
         """
         按文件大小过滤
 
         Args:
-            file_paths: 文件路径列表
+            files: 文件路径，或scan_directory_entries返回的(文件路径, 文件大小)对；
+                   已知大小的文件不再重复stat
             max_size_mb: 最大文件大小（MB）
 
-        Returns:
-            符合大小限制的文件路径列表
+        Yields:
+            符合大小限制的文件路径
         """
-        filtered = []
         max_size_bytes = max_size_mb * 1024 * 1024
 
-        for file_path in file_paths:
-            try:
-                file_size = Path(file_path).stat().st_size
-                if file_size <= max_size_bytes:
-                    filtered.append(file_path)
-                else:
-                    size_mb = file_size / (1024 * 1024)
-                    print(f"跳过: {file_path} (大小 {size_mb:.2f}MB 超过限制 {max_size_mb}MB)")
-            except Exception as e:
-                print(f"警告: 获取文件大小失败 {file_path} - {e}")
-
-        return filtered
+        for item in files:
+            if isinstance(item, tuple):
+                file_path, file_size = item
+            else:
+                file_path = item
+                try:
+                    file_size = os.stat(file_path).st_size
+                except Exception as e:
+                    logger.warning("警告: 获取文件大小失败 %s - %s", file_path, e)
+                    continue
+
+            if file_size <= max_size_bytes:
+                yield file_path
+            else:
+                size_mb = file_size / (1024 * 1024)
+                logger.info("跳过: %s (大小 %.2fMB 超过限制 %sMB)", file_path, size_mb, max_size_mb)
 
     def validate_files(self, file_paths: List[str]) -> List[str]:
         """
@@ -156,15 +213,15 @@ class FileScanner:
 
         for file_path in file_paths:
             if not os.path.exists(file_path):
-                print(f"跳过: 文件不存在 - {file_path}")
+                logger.info("跳过: 文件不存在 - %s", file_path)
                 continue
 
             if not os.path.isfile(file_path):
-                print(f"跳过: 不是文件 - {file_path}")
+                logger.info("跳过: 不是文件 - %s", file_path)
                 continue
 
-            if not file_path.endswith('.jsonl'):
-                print(f"警告: 文件不是.jsonl扩展名 - {file_path}")
+            if not file_path.endswith(self.JSONL_SUFFIXES):
+                logger.warning("警告: 文件不是.jsonl扩展名 - %s", file_path)
 
             valid_files.append(file_path)
 
@@ -4,10 +4,63 @@ JSONL文件解析模块
 负责解析JSONL格式的网络连接日志文件
 """
 import json
-import chardet
-from typing import List, Dict, Any, Optional, Tuple
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import codecs
+import io
+import sys
+from contextlib import contextmanager, redirect_stdout
+from typing import Iterable, Iterator, List, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 
+# JSON解析后端：优先orjson，其次ujson，最后回退到标准库json
+try:
+    import orjson as _json_backend
+except ImportError:
+    try:
+        import ujson as _json_backend
+    except ImportError:
+        _json_backend = json
+
+# 编码检测后端：优先cchardet（C实现），其次charset_normalizer，均未安装时按UTF-8处理
+try:
+    import cchardet
+
+    def _detect_charset(raw_data: bytes) -> Tuple[Optional[str], float]:
+        result = cchardet.detect(raw_data)
+        return result['encoding'], result['confidence'] or 0.0
+except ImportError:
+    try:
+        import charset_normalizer
+
+        def _detect_charset(raw_data: bytes) -> Tuple[Optional[str], float]:
+            best = charset_normalizer.from_bytes(raw_data).best()
+            if best is None:
+                return None, 0.0
+            return best.encoding, 1.0
+    except ImportError:
+        def _detect_charset(raw_data: bytes) -> Tuple[Optional[str], float]:
+            return None, 0.0
+
+# 文件头BOM与对应编码
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 可按字节直接解析的编码（orjson要求UTF-8输入）
+_UTF8_ENCODINGS = frozenset({'utf-8', 'utf8', 'utf-8-sig', 'ascii'})
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+# 按字节读取时的块大小（1MiB）
+_READ_BLOCK_SIZE = 1 << 20
+
+# 文件总大小超过此值时才启用多进程解析（小文件进程启动与结果传输的开销大于解析本身）
+_PARALLEL_MIN_BYTES = 8 << 20
+
 
 class JSONLParser:
     """JSONL文件解析器"""
@@ -18,6 +71,16 @@ class JSONLParser:
         'user', 'dest_ip', 'dest_port',
         'protocol', 'domain', 'source'
     ]
+    _EXPECTED_FIELDS_SET = frozenset(EXPECTED_FIELDS)
+
+    # 取值重复度高、解析时复用字符串对象的字段（时间戳几乎各不相同，不参与）
+    POOLED_FIELDS = (
+        'process', 'command_line', 'user', 'dest_ip',
+        'dest_port', 'protocol', 'domain', 'source'
+    )
+
+    # 单行JSON解析函数（接受str或bytes）
+    _loads = staticmethod(_json_backend.loads)
 
     def __init__(self, max_size_mb: int = 10):
         """
@@ -33,6 +96,8 @@ class JSONLParser:
         """
         检测文件编码
 
+        先看BOM，再尝试按UTF-8解码文件头；只有不是UTF-8时才调用编码检测库
+
         Args:
             file_path: 文件路径
 
@@ -42,19 +107,35 @@ class JSONLParser:
         try:
             with open(file_path, 'rb') as f:
                 raw_data = f.read(10000)  # 读取前10KB来检测编码
-                result = chardet.detect(raw_data)
-                encoding = result['encoding']
-                confidence = result['confidence']
+        except Exception as e:
+            print(f"警告: 检测编码失败 - {e}，使用UTF-8")
+            return 'utf-8'
 
-                # 如果置信度太低，使用默认编码
-                if confidence < 0.7:
-                    encoding = 'utf-8'
+        # BOM直接确定编码
+        for bom, encoding in _BOM_ENCODINGS:
+            if raw_data.startswith(bom):
+                return encoding
 
-                return encoding or 'utf-8'
+        # 机器生成的JSONL几乎都是UTF-8：能解码即可直接返回
+        # （增量解码器不会因文件头截断在多字节字符中间而误判）
+        try:
+            codecs.getincrementaldecoder('utf-8')().decode(raw_data, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            pass
+
+        try:
+            encoding, confidence = _detect_charset(raw_data)
         except Exception as e:
             print(f"警告: 检测编码失败 - {e}，使用UTF-8")
             return 'utf-8'
 
+        # 如果置信度太低，使用默认编码
+        if confidence < 0.7:
+            encoding = 'utf-8'
+
+        return encoding or 'utf-8'
+
     def check_file_size(self, file_path: str) -> bool:
         """
         检查文件大小是否在限制范围内
@@ -76,12 +157,12 @@ class JSONLParser:
             print(f"错误: 检查文件大小失败 - {e}")
             return False
 
-    def parse_line(self, line: str, line_num: int) -> Optional[Dict[str, Any]]:
+    def parse_line(self, line: Union[str, bytes], line_num: int) -> Optional[Dict[str, Any]]:
         """
         解析单行JSONL数据
 
         Args:
-            line: JSONL行字符串
+            line: JSONL行（字符串，或UTF-8编码的字节串）
             line_num: 行号
 
         Returns:
@@ -92,9 +173,14 @@ class JSONLParser:
             return None
 
         try:
-            data = json.loads(line)
-            return data
-        except json.JSONDecodeError as e:
+            return self._loads(line)
+        except ValueError as e:
+            if isinstance(line, bytes):
+                # 与文本模式 errors='ignore' 保持一致：丢弃非法UTF-8字节后重试
+                try:
+                    return self._loads(line.decode('utf-8', errors='ignore'))
+                except ValueError:
+                    pass
             error_msg = f"第{line_num}行: JSON解析失败 - {e}"
             self.errors.append(error_msg)
             return None
@@ -110,35 +196,35 @@ class JSONLParser:
         Returns:
             True if 验证通过, False otherwise
         """
-        missing_fields = []
-        for field in self.EXPECTED_FIELDS:
-            if field not in record:
-                missing_fields.append(field)
-
-        if missing_fields:
+        # 一次集合差运算找出缺失字段（在C层完成，无需逐字段循环）
+        missing = self._EXPECTED_FIELDS_SET.difference(record.keys() if isinstance(record, dict) else ())
+        if missing:
+            # 按期望字段顺序输出缺失字段
+            missing_fields = [field for field in self.EXPECTED_FIELDS if field in missing]
             error_msg = f"第{line_num}行: 缺少字段 {missing_fields}"
             self.errors.append(error_msg)
             return False
 
         return True
 
-    def parse_file(self, file_path: str, validate: bool = True) -> Tuple[List[Dict[str, Any]], List[str]]:
+    def iter_records(self, file_path: str, validate: bool = True) -> Iterator[Dict[str, Any]]:
         """
-        解析JSONL文件
+        逐条解析JSONL文件，边读边产出记录，不在内存中累积整个文件
+
+        错误信息累积在 self.errors 中，迭代结束后可读取
 
         Args:
             file_path: JSONL文件路径
             validate: 是否验证字段完整性
 
-        Returns:
-            (记录列表, 错误列表)
+        Yields:
+            解析后的记录字典
         """
         self.errors = []
-        records = []
 
         # 检查文件大小
         if not self.check_file_size(file_path):
-            return records, self.errors
+            return
 
         # 检测编码
         encoding = self.detect_encoding(file_path)
@@ -146,35 +232,68 @@ class JSONLParser:
 
         # 解析文件
         line_num = 0
+        record_count = 0
+        # 字段值池：进程、IP、端口等取值高度重复，复用字符串对象可显著减少内存占用，
+        # 后续计数时哈希与比较也更快
+        pool_value = {}.setdefault
         try:
-            with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-                for line in f:
+            with _open_lines(file_path, encoding) as lines:
+                for line in lines:
                     line_num += 1
+                    if line_num == 1 and isinstance(line, bytes) and line.startswith(_UTF8_BOM):
+                        line = line[len(_UTF8_BOM):]
 
                     # 解析单行
                     record = self.parse_line(line, line_num)
                     if record is None:
                         continue
 
+                    # 合法JSON但不是对象（数组、字符串、数字等）的行无论是否验证都丢弃
+                    if not isinstance(record, dict):
+                        self.errors.append(f"第{line_num}行: 记录不是JSON对象")
+                        continue
+
                     # 验证字段
                     if validate and not self.validate_record(record, line_num):
                         continue
 
-                    records.append(record)
+                    # 重复出现的字段值共用同一个字符串对象
+                    for field in self.POOLED_FIELDS:
+                        value = record.get(field)
+                        if type(value) is str:
+                            record[field] = pool_value(value, value)
 
-            print(f"成功解析 {len(records)} 条记录，遇到 {len(self.errors)} 个错误")
+                    record_count += 1
+                    yield record
+
+            print(f"成功解析 {record_count} 条记录，遇到 {len(self.errors)} 个错误")
 
         except Exception as e:
             error_msg = f"读取文件失败: {e}"
             self.errors.append(error_msg)
             print(f"错误: {error_msg}")
 
+    def parse_file(self, file_path: str, validate: bool = True) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        解析JSONL文件
+
+        Args:
+            file_path: JSONL文件路径
+            validate: 是否验证字段完整性
+
+        Returns:
+            (记录列表, 错误列表)
+        """
+        records = list(self.iter_records(file_path, validate))
         return records, self.errors
 
     def parse_multiple_files(self, file_paths: List[str], validate: bool = True) -> Tuple[List[Dict[str, Any]], List[str]]:
         """
         解析多个JSONL文件
 
+        多个文件且总大小超过阈值时每个文件交给一个子进程解析（JSON解析是CPU密集型，
+        线程受GIL限制），结果按输入顺序合并
+
         Args:
             file_paths: JSONL文件路径列表
             validate: 是否验证字段完整性
@@ -185,15 +304,56 @@ class JSONLParser:
         all_records = []
         all_errors = []
 
-        for file_path in file_paths:
-            print(f"\n解析文件: {file_path}")
-            records, errors = self.parse_file(file_path, validate)
+        # 一次性通知内核预读所有文件，磁盘读取与解析重叠进行
+        _prefetch_files(file_paths)
+
+        for records, errors in self._parse_each(file_paths, validate):
             all_records.extend(records)
             all_errors.extend(errors)
 
         print(f"\n总计: 解析 {len(all_records)} 条记录，{len(all_errors)} 个错误")
         return all_records, all_errors
 
+    def _parse_each(self, file_paths: List[str], validate: bool) -> Iterator[Tuple[List[Dict[str, Any]], List[str]]]:
+        """
+        逐个产出每个文件的解析结果，保持输入顺序
+
+        文件总大小超过 _PARALLEL_MIN_BYTES 且有多个文件时，每个文件交给一个子进程解析；
+        子进程的输出由父进程按文件顺序打印，每个文件解析完即产出，不等待全部完成
+
+        Args:
+            file_paths: JSONL文件路径列表
+            validate: 是否验证字段完整性
+
+        Yields:
+            (记录列表, 错误列表)
+        """
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+        done = 0
+
+        if max_workers > 1 and _total_size(file_paths) > _PARALLEL_MIN_BYTES:
+            max_size_mb = self.max_size_bytes / (1024 * 1024)
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(_parse_one, file_path, validate, max_size_mb)
+                        for file_path in file_paths
+                    ]
+                    # 按提交顺序取结果，保证记录与输出顺序和串行解析一致
+                    for file_path, future in zip(file_paths, futures):
+                        records, errors, output = future.result()
+                        print(f"\n解析文件: {file_path}")
+                        sys.stdout.write(output)
+                        done += 1
+                        yield records, errors
+                return
+            except (OSError, BrokenProcessPool) as e:
+                print(f"警告: 多进程解析不可用 - {e}，改为逐个解析")
+
+        for file_path in file_paths[done:]:
+            print(f"\n解析文件: {file_path}")
+            yield self.parse_file(file_path, validate)
+
     def get_error_summary(self, errors: List[str]) -> str:
         """
         获取错误摘要
@@ -228,7 +388,7 @@ class JSONLParser:
         Returns:
             字段值列表
         """
-        return [record.get(field) for record in records if record.get(field)]
+        return [value for record in records if (value := record.get(field))]
 
     def get_record_summary(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -250,12 +410,134 @@ class JSONLParser:
             'total_count': len(records),
         }
 
-        # 统计每个字段的非空数量
-        for field in self.EXPECTED_FIELDS:
-            non_empty_count = sum(
-                1 for record in records
-                if record.get(field) not in [None, '']
-            )
+        # 统计每个字段的非空数量（单次遍历记录）
+        field_counts = dict.fromkeys(self.EXPECTED_FIELDS, 0)
+        for record in records:
+            for field, value in record.items():
+                if field in field_counts and value is not None and value != '':
+                    field_counts[field] += 1
+
+        for field, non_empty_count in field_counts.items():
             summary[f'{field}_count'] = non_empty_count
 
         return summary
+
+
+def _prefetch_files(file_paths: List[str]) -> None:
+    """
+    提示内核异步预读文件（posix_fadvise WILLNEED），仅在支持的平台上生效
+
+    Args:
+        file_paths: 文件路径列表
+    """
+    if len(file_paths) < 2 or not hasattr(os, 'posix_fadvise'):
+        return
+
+    for file_path in file_paths:
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def _open_lines(file_path: str, encoding: str) -> Iterator[Iterable[Union[str, bytes]]]:
+    """
+    打开JSONL文件并提供逐行迭代器
+
+    UTF-8文件以只读方式内存映射，按字节逐行交给JSON解析器，
+    省去逐行解码以及缓冲区到Python对象的额外拷贝；其他编码按文本模式读取
+
+    Args:
+        file_path: 文件路径
+        encoding: 文件编码
+
+    Yields:
+        行迭代器（UTF-8文件为bytes行，其他编码为str行）
+    """
+    if encoding.lower() not in _UTF8_ENCODINGS:
+        with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
+            yield f
+        return
+
+    with open(file_path, 'rb', buffering=_READ_BLOCK_SIZE) as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # 空文件等无法映射的情况，退回按块读取
+            mm = None
+
+        if mm is None:
+            yield _iter_block_lines(f)
+            return
+
+        with mm:
+            yield iter(mm.readline, b'')
+
+
+def _iter_block_lines(f) -> Iterator[bytes]:
+    """
+    按大块读取二进制文件并切分行，减少逐行读取的调用开销
+
+    Args:
+        f: 以二进制模式打开的文件对象
+
+    Yields:
+        不含换行符的行字节串
+    """
+    tail = b''
+    while True:
+        block = f.read(_READ_BLOCK_SIZE)
+        if not block:
+            break
+        lines = (tail + block).split(b'\n') if tail else block.split(b'\n')
+        # 最后一段可能是不完整的行，留到下一块拼接
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def _total_size(file_paths: List[str]) -> int:
+    """
+    统计文件总大小（无法获取大小的文件按0计）
+
+    Args:
+        file_paths: 文件路径列表
+
+    Returns:
+        总字节数
+    """
+    total = 0
+    for file_path in file_paths:
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass
+    return total
+
+
+def _parse_one(file_path: str, validate: bool, max_size_mb: float) -> Tuple[List[Dict[str, Any]], List[str], str]:
+    """
+    在子进程中解析单个JSONL文件（模块级函数，便于多进程pickle）
+
+    解析过程中的输出不直接打印，而是收集后返回，由父进程按文件顺序打印
+
+    Args:
+        file_path: JSONL文件路径
+        validate: 是否验证字段完整性
+        max_size_mb: 最大文件大小限制（MB）
+
+    Returns:
+        (记录列表, 错误列表, 解析输出文本)
+    """
+    output = io.StringIO()
+    with redirect_stdout(output):
+        records, errors = JSONLParser(max_size_mb=max_size_mb).parse_file(file_path, validate)
+    return records, errors, output.getvalue()
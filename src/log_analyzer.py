@@ -3,8 +3,11 @@
 
 负责分析网络连接日志，生成统计数据
 """
-from typing import List, Dict, Any
-from collections import defaultdict
+import heapq
+from typing import Iterable, List, Dict, Any, Optional
+from collections import Counter, defaultdict
+from functools import lru_cache
+from operator import itemgetter
 
 from src.utils import IPClassifier, TimeParser, StatsCalculator
 from src.config import Config
@@ -13,90 +16,57 @@ from src.threat_intel_client import ThreatIntelClient, ThreatIntelAnalyzer
 class LogAnalyzer:
     """日志分析器"""
 
-    def __init__(self):
-        """初始化日志分析器"""
+    def __init__(self, config: Optional[Config] = None):
+        """
+        初始化日志分析器
+
+        Args:
+            config: 配置对象，为None时加载默认配置（命令行覆盖的配置需由调用方传入）
+        """
         self.ip_classifier = IPClassifier()
         self.time_parser = TimeParser()
         self.stats_calculator = StatsCalculator()
-        self.config = Config()
+        self.config = config or Config()
+
+        # IP分类结果按IP缓存：不同IP数远小于记录数，逐条记录分类时只解析一次
+        self._is_internal = lru_cache(maxsize=65536)(self.ip_classifier.is_internal)
+        self._is_external = lru_cache(maxsize=65536)(self.ip_classifier.is_external)
 
-    def analyze(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
         """
         分析日志记录
 
         Args:
-            records: 日志记录列表
+            records: 日志记录（列表或生成器均可，只遍历一次）
 
         Returns:
             分析结果字典
         """
-        if not records:
-            return {
-                'summary': {'total_count': 0},
-                'time_analysis': {},
-                'process_analysis': {},
-                'user_analysis': {},
-                'ip_analysis': {},
-                'port_analysis': {},
-                'protocol_analysis': {},
-                'domain_analysis': {},
-            }
-
-        print("开始分析日志数据...")
+        return self._analyze_collected(self._collect(records))
 
-        # 提取各字段数据
-        timestamps = [r.get('timestamp') for r in records if r.get('timestamp')]
-        processes = [r.get('process') for r in records if r.get('process')]
-        users = [r.get('user') for r in records if r.get('user')]
-        dest_ips = [r.get('dest_ip') for r in records if r.get('dest_ip')]
-        dest_ports = [r.get('dest_port') for r in records if r.get('dest_port')]
-        protocols = [r.get('protocol') for r in records if r.get('protocol')]
-        domains = [r.get('domain') for r in records if r.get('domain')]
-
-        # 执行各种分析
-        result = {
-            'summary': {
-                'total_count': len(records),
-                'unique_ips': len(set(dest_ips)),
-                'unique_users': len(set(users)),
-                'unique_processes': len(set(processes)),
-            },
-            'time_analysis': self._analyze_time(timestamps),
-            'process_analysis': self._analyze_processes(processes, records),
-            'user_analysis': self._analyze_users(users),
-            'ip_analysis': self._analyze_ips(dest_ips),
-            'port_analysis': self._analyze_ports(dest_ports),
-            'protocol_analysis': self._analyze_protocols(protocols),
-            'domain_analysis': self._analyze_domains(domains),
-            'anomalies': self._detect_anomalies(records, timestamps, dest_ips, dest_ports),
-        }
-
-        print("日志分析完成")
-        return result
-
-    def analyze_with_threat_intel(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def analyze_with_threat_intel(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
         """
         结合威胁情报分析日志
 
         Args:
-            records: 日志记录列表
+            records: 日志记录（列表或生成器均可，只遍历一次）
 
         Returns:
             包含威胁情报的分析结果
         """
         # 先进行基础分析
-        result = self.analyze(records)
+        collected = self._collect(records)
+        result = self._analyze_collected(collected)
 
         # 检查配置是否启用威胁情报
         if not self.config.get('threat_intel.enabled', False):
             return result
 
         # 收集外网IP
-        external_ips = set()
-        for record in records:
-            dest_ip = record.get('dest_ip', '')
-            if dest_ip and not self.ip_classifier.is_internal(dest_ip):
-                external_ips.add(dest_ip)
+        external_ips = {
+            dest_ip for dest_ip in set(collected['dest_ips'])
+            if not self._is_internal(dest_ip)
+        }
 
         if not external_ips:
             return result
@@ -104,22 +74,171 @@ class LogAnalyzer:
         # 查询威胁情报
         print(f"查询 {len(external_ips)} 个外网IP的威胁情报...")
         client = ThreatIntelClient(self.config)
-        analyzer = ThreatIntelAnalyzer(client)
-
-        threat_intel_result = analyzer.analyze_ips(list(external_ips))
+        try:
+            analyzer = ThreatIntelAnalyzer(client)
+            threat_intel_result = analyzer.analyze_ips(list(external_ips))
+        finally:
+            client.close()
 
         # 将威胁情报添加到分析结果中
         result['threat_intel'] = threat_intel_result
 
         return result
 
+    def _collect(self, records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        单次遍历日志记录，提取各字段数据并完成逐条记录的检测
+
+        Args:
+            records: 日志记录
+
+        Returns:
+            各字段值列表及逐条检测结果
+        """
+        timestamps = []
+        processes = []
+        users = []
+        dest_ips = []
+        dest_ports = []
+        protocols = []
+        domains = []
+
+        privileged_processes = Counter()
+        process_external_ips = defaultdict(set)
+        abnormal_time_connections = []
+        high_risk_port_connections = []
+        total_count = 0
+
+        for record in records:
+            total_count += 1
+            timestamp = record.get('timestamp', '')
+            process = record.get('process', '')
+            user = record.get('user', '')
+            dest_ip = record.get('dest_ip', '')
+            dest_port = record.get('dest_port', '')
+            protocol = record.get('protocol')
+            domain = record.get('domain')
+
+            # 提取各字段数据
+            if timestamp:
+                timestamps.append(timestamp)
+            if process:
+                processes.append(process)
+            if user:
+                users.append(user)
+            if dest_ip:
+                dest_ips.append(dest_ip)
+            if dest_port:
+                dest_ports.append(dest_port)
+            if protocol:
+                protocols.append(protocol)
+            if domain:
+                domains.append(domain)
+
+            # 进程-外网IP关联，以及特权账户进程的外网访问
+            if process and dest_ip and self._is_external(dest_ip):
+                process_external_ips[process].add(dest_ip)
+                # 三次子串判断比正则交替匹配更快（短字符串上正则的调用开销占主导）
+                if user and ('SYSTEM' in user or 'NETWORK SERVICE' in user or 'LOCAL SERVICE' in user):
+                    privileged_processes[process] += 1
+
+            # 异常时间连接（采样前10个）
+            if (timestamp and len(abnormal_time_connections) < 10
+                    and self.time_parser.is_abnormal_time(self.time_parser.parse(timestamp))):
+                abnormal_time_connections.append({
+                    'timestamp': timestamp,
+                    'process': process,
+                    'dest_ip': dest_ip,
+                    'dest_port': dest_port,
+                })
+
+            # 高危端口连接（采样前10个）
+            if self.ip_classifier.is_high_risk_port(dest_port):
+                high_risk_port_connections.append({
+                    'timestamp': timestamp,
+                    'process': process,
+                    'dest_ip': dest_ip,
+                    'dest_port': dest_port,
+                    'service': self.ip_classifier.get_high_risk_service(dest_port),
+                })
+
+        return {
+            'total_count': total_count,
+            'timestamps': timestamps,
+            'processes': processes,
+            'users': users,
+            'dest_ips': dest_ips,
+            'dest_ports': dest_ports,
+            'protocols': protocols,
+            'domains': domains,
+            'privileged_processes': privileged_processes,
+            'process_external_ips': process_external_ips,
+            'abnormal_time_connections': abnormal_time_connections,
+            'high_risk_port_connections': high_risk_port_connections,
+        }
+
+    def _analyze_collected(self, collected: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        基于单次遍历得到的数据生成分析结果
+
+        Args:
+            collected: _collect 的返回值
+
+        Returns:
+            分析结果字典
+        """
+        if not collected['total_count']:
+            return {
+                'summary': {'total_count': 0},
+                'time_analysis': {},
+                'process_analysis': {},
+                'user_analysis': {},
+                'ip_analysis': {},
+                'port_analysis': {},
+                'protocol_analysis': {},
+                'domain_analysis': {},
+            }
+
+        print("开始分析日志数据...")
+
+        # 执行各种分析（每个字段只统计一次，汇总与异常检测复用各分析结果）
+        time_analysis = self._analyze_time(collected['timestamps'])
+        process_analysis = self._analyze_processes(collected['processes'], collected['privileged_processes'])
+        user_analysis = self._analyze_users(collected['users'])
+        ip_analysis = self._analyze_ips(collected['dest_ips'])
+        port_analysis = self._analyze_ports(collected['dest_ports'])
+
+        result = {
+            'summary': {
+                'total_count': collected['total_count'],
+                'unique_ips': ip_analysis['unique_count'],
+                'unique_users': user_analysis['unique_count'],
+                'unique_processes': process_analysis['unique_count'],
+            },
+            'time_analysis': time_analysis,
+            'process_analysis': process_analysis,
+            'user_analysis': user_analysis,
+            'ip_analysis': ip_analysis,
+            'port_analysis': port_analysis,
+            'protocol_analysis': self._analyze_protocols(collected['protocols']),
+            'domain_analysis': self._analyze_domains(collected['domains']),
+            'anomalies': self._detect_anomalies(
+                collected, time_analysis['abnormal_time_count'], port_analysis['distribution']
+            ),
+        }
+
+        print("日志分析完成")
+        return result
+
     def _analyze_time(self, timestamps: List[str]) -> Dict[str, Any]:
         """分析时间分布"""
-        time_range = self.time_parser.get_time_range(timestamps)
-        hour_dist = self.time_parser.get_hour_distribution(timestamps)
-        date_dist = self.time_parser.get_date_distribution(timestamps)
-        period_dist = self.time_parser.get_time_period_distribution(timestamps)
-        abnormal_times = self.time_parser.get_abnormal_time_connections(timestamps)
+        # 一次遍历得到时间范围、各类分布与异常时间计数
+        summary = self.time_parser.summarize(timestamps)
+        time_range = summary['time_range']
+        hour_dist = summary['hour_distribution']
+        date_dist = summary['date_distribution']
+        period_dist = summary['period_distribution']
+        abnormal_time_count = summary['abnormal_time_count']
 
         # 找出高峰时段
         peak_hour = max(hour_dist.items(), key=lambda x: x[1]) if hour_dist else (0, 0)
@@ -130,51 +249,43 @@ class LogAnalyzer:
             'date_distribution': date_dist,
             'period_distribution': period_dist,
             'peak_hour': peak_hour,
-            'abnormal_time_count': len(abnormal_times),
+            'abnormal_time_count': abnormal_time_count,
             'abnormal_time_percentage': self.stats_calculator.get_percentage(
-                len(abnormal_times), len(timestamps)
+                abnormal_time_count, len(timestamps)
             ),
         }
 
-    def _analyze_processes(self, processes: List[str], records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def _analyze_processes(self, processes: List[str], privileged_processes: Counter) -> Dict[str, Any]:
         """分析进程信息"""
         stats = self.stats_calculator.calculate_process_stats(processes)
 
-        # 分析特权进程的外网访问
-        privileged_processes = {}
-        for record in records:
-            user = record.get('user', '')
-            process = record.get('process', '')
-            dest_ip = record.get('dest_ip', '')
-
-            if 'SYSTEM' in user or 'NETWORK SERVICE' in user or 'LOCAL SERVICE' in user:
-                if process and dest_ip and self.ip_classifier.is_external(dest_ip):
-                    if process not in privileged_processes:
-                        privileged_processes[process] = 0
-                    privileged_processes[process] += 1
-
-        stats['privileged_external_connections'] = [
-            (process, count)
-            for process, count in sorted(privileged_processes.items(), key=lambda x: x[1], reverse=True)[:10]
+        # 特权进程的外网访问（已在单次遍历中统计）
+        stats['privileged_external_connections'] = heapq.nlargest(
+            10, privileged_processes.items(), key=itemgetter(1)
+        )
+        # Top 5 进程名（AI提示词直接使用）
+        stats['top_processes_top5'] = [
+            (process.rsplit('\\', 1)[-1], count) for process, count in stats['top_processes'][:5]
         ]
 
         return stats
 
     def _analyze_users(self, users: List[str]) -> Dict[str, Any]:
         """分析用户信息"""
-        return self.stats_calculator.calculate_user_stats(users)
+        stats = self.stats_calculator.calculate_user_stats(users)
+        stats['top_users_top5'] = stats['top_users'][:5]
+        return stats
 
     def _analyze_ips(self, ips: List[str]) -> Dict[str, Any]:
         """分析IP地址信息"""
         # 原有统计分析
         stats = self.stats_calculator.calculate_ip_stats(ips)
+        stats['top_ips_top5'] = stats['top_ips'][:5]
 
         return stats
 
     def _analyze_ports(self, ports: List[str]) -> Dict[str, Any]:
         """分析端口信息"""
-        from utils.ip_utils import IPClassifier
-
         stats = self.stats_calculator.calculate_port_stats(ports)
 
         # 详细端口信息
@@ -188,6 +299,7 @@ class LogAnalyzer:
             }
 
         stats['port_details'] = port_details
+        stats['top_ports_top5'] = stats['top_ports'][:5]
 
         return stats
 
@@ -199,74 +311,38 @@ class LogAnalyzer:
         """分析域名信息"""
         return self.stats_calculator.calculate_domain_stats(domains)
 
-    def _detect_anomalies(self, records: List[Dict[str, Any]],
-                          timestamps: List[str],
-                          dest_ips: List[str],
-                          dest_ports: List[str]) -> Dict[str, Any]:
+    def _detect_anomalies(self, collected: Dict[str, Any], abnormal_time_count: int,
+                          port_dist: Dict[str, int]) -> Dict[str, Any]:
         """检测异常行为"""
         anomalies = {
-            'abnormal_time_connections': [],
-            'abnormal_time_count': 0,
-            'high_risk_port_connections': [],
+            'abnormal_time_connections': collected['abnormal_time_connections'],
+            'abnormal_time_count': abnormal_time_count,
+            'high_risk_port_connections': collected['high_risk_port_connections'],
             'unusual_external_connections': [],
             'suspicious_process_ips': [],
             'uncommon_ports_count': 0,
             'uncommon_ports': [],
         }
 
-        # 检测异常时间连接
-        abnormal_timestamps = self.time_parser.get_abnormal_time_connections(timestamps)
-        anomalies['abnormal_time_count'] = len(abnormal_timestamps)
-        abnormal_timestamps_set = set(abnormal_timestamps)
-
-        for record in records:
-            timestamp = record.get('timestamp', '')
-            dest_ip = record.get('dest_ip', '')
-            dest_port = record.get('dest_port', '')
-            process = record.get('process', '')
-
-            # 异常时间连接（采样前10个）
-            if timestamp in abnormal_timestamps_set and len(anomalies['abnormal_time_connections']) < 10:
-                anomalies['abnormal_time_connections'].append({
-                    'timestamp': timestamp,
-                    'process': process,
-                    'dest_ip': dest_ip,
-                    'dest_port': dest_port,
-                })
-
-            # 高危端口连接（采样前10个）
-            if self.ip_classifier.is_high_risk_port(dest_port):
-                anomalies['high_risk_port_connections'].append({
-                    'timestamp': timestamp,
-                    'process': process,
-                    'dest_ip': dest_ip,
-                    'dest_port': dest_port,
-                    'service': self.ip_classifier.get_high_risk_service(dest_port),
-                })
-
         # 检测非常规端口访问
-        port_dist = self.stats_calculator.get_distribution(dest_ports)
-        common_ports = set(self.ip_classifier.COMMON_PORTS.keys())
-        uncommon_ports = [p for p in port_dist.keys() if p and p not in common_ports and self.ip_classifier.get_port_service(p) == '未知']
+        # 不在常见端口表中的端口即为未知服务端口
+        common_ports = self.ip_classifier.COMMON_PORTS_SET
+        uncommon_ports = [p for p in port_dist if p and p not in common_ports]
 
         anomalies['uncommon_ports_count'] = len(uncommon_ports)
-        anomalies['uncommon_ports'] = sorted(uncommon_ports, key=lambda x: port_dist[x], reverse=True)[:10]
+        anomalies['uncommon_ports'] = heapq.nlargest(10, uncommon_ports, key=port_dist.get)
 
         # 检测可疑进程-IP关联（相同进程访问大量不同外网IP）
-        process_external_ips = defaultdict(set)
-        for record in records:
-            process = record.get('process', '')
-            dest_ip = record.get('dest_ip', '')
-            if process and dest_ip and self.ip_classifier.is_external(dest_ip):
-                process_external_ips[process].add(dest_ip)
-
-        for process, ips in sorted(process_external_ips.items(), key=lambda x: len(x[1]), reverse=True):
-            if len(ips) > 5:  # 访问超过5个不同外网IP
-                anomalies['suspicious_process_ips'].append({
-                    'process': process,
-                    'external_ip_count': len(ips),
-                    'external_ips': list(ips)[:10],
-                })
+        process_external_ips = collected['process_external_ips']
+        # 先筛出访问超过5个不同外网IP的进程，只对筛选结果排序
+        suspicious = [(process, ips) for process, ips in process_external_ips.items() if len(ips) > 5]
+        for process, ips in sorted(suspicious, key=lambda x: len(x[1]), reverse=True):
+            anomalies['suspicious_process_ips'].append({
+                'process': process,
+                'process_name': process.rsplit('\\', 1)[-1],
+                'external_ip_count': len(ips),
+                'external_ips': list(ips)[:10],
+            })
 
         return anomalies
 
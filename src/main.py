@@ -6,17 +6,13 @@ Windows网络流量智能分析工具 - 主程序入口
 import sys
 import os
 import argparse
+import logging
 from datetime import datetime
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.config import Config, AIProvidersConfig
-from src.file_scanner import FileScanner
-from src.jsonl_parser import JSONLParser
-from src.log_analyzer import LogAnalyzer
-from src.ai_client import get_ai_client
-from src.reporter import MarkdownReporter
 
 
 def parse_args():
@@ -89,12 +85,30 @@ def parse_args():
         help='禁用AI分析'
     )
 
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用AI分析与威胁情报缓存，强制重新调用API'
+    )
+
     parser.add_argument(
         '--config',
         type=str,
         help='配置文件路径 (默认: config/config.yaml)'
     )
 
+    parser.add_argument(
+        '--no-validate',
+        action='store_true',
+        help='跳过逐条记录的字段完整性校验（缺少字段的记录也参与分析）'
+    )
+
+    parser.add_argument(
+        '--verbose', '-v',
+        action='store_true',
+        help='显示详细日志（如扫描到的每个文件）'
+    )
+
     parser.add_argument(
         '--max-size',
         type=float,
@@ -135,6 +149,12 @@ def main():
     # 解析命令行参数
     args = parse_args()
 
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(message)s',
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+
     # 验证参数
     if not args.file and not args.dir and not args.check_ip and not args.check_ip_range:
         print("错误: 必须指定 --file、--dir、--check-ip 或 --check-ip-range 参数")
@@ -155,46 +175,17 @@ def main():
         config.update('threat_intel.abuseipdb_api_key', args.abuseipdb_key)
     if hasattr(args, 'no_threat_intel') and args.no_threat_intel:
         config.update('threat_intel.enabled', False)
+    if args.no_cache:
+        config.update('threat_intel.cache_dir', '')
 
     # 创建输出目录
     output_dir = config.get_output_dir()
     os.makedirs(output_dir, exist_ok=True)
     print(f"输出目录: {output_dir}")
 
-    # 处理威胁情报查询命令
-    threat_intel_only = bool(args.check_ip or args.check_ip_range)
-
-    # 如果是IP查询模式，跳过文件扫描
-    if threat_intel_only:
-        pass
-    else:
-        # 扫描文件
-        print("\n" + "="*60)
-        print("扫描文件...")
-        print("="*60)
-
-        file_scanner = FileScanner()
-        file_paths = []
-
-        if args.file:
-            # 单文件模式
-            file_path = file_scanner.scan_single_file(args.file)
-            if file_path:
-                file_paths.append(file_path)
-        else:
-            # 目录模式
-            file_paths = file_scanner.scan_directory(args.dir)
-
-        if not file_paths:
-            print("错误: 未找到有效的JSONL文件")
-            sys.exit(1)
-
-    # 处理威胁情报查询命令
-    threat_intel_only = bool(args.check_ip or args.check_ip_range)
-
-    if threat_intel_only:
-        # 仅进行威胁情报查询
-        from threat_intel_client import ThreatIntelClient
+    # 处理威胁情报查询命令（IP查询模式不扫描文件，查询后直接退出）
+    if args.check_ip or args.check_ip_range:
+        from src.threat_intel_client import ThreatIntelClient
 
         print("\n" + "="*60)
         print("威胁情报查询...")
@@ -203,6 +194,8 @@ def main():
         client = ThreatIntelClient(config)
         if not client.is_enabled():
             print("警告: 威胁情报未启用或未配置API密钥")
+
+        try:
             if args.check_ip:
                 # 查询单个IP
                 result = client.check_ip(args.check_ip)
@@ -225,11 +218,42 @@ def main():
                     print(f"查询完成: {total}个IP, {malicious}个恶意IP")
                 else:
                     print("查询失败")
+        finally:
+            client.close()
 
         sys.exit(0)
 
+    # 分析相关模块按需导入（--help 与IP查询模式无需加载）
+    from src.file_scanner import FileScanner
+    from src.jsonl_parser import JSONLParser
+    from src.log_analyzer import LogAnalyzer
+    from src.reporter import MarkdownReporter
+
+    # 扫描文件
+    print("\n" + "="*60)
+    print("扫描文件...")
+    print("="*60)
+
+    file_scanner = FileScanner()
+    file_paths = []
+
+    if args.file:
+        # 单文件模式
+        file_path = file_scanner.scan_single_file(args.file)
+        if file_path:
+            file_paths.append(file_path)
+        file_entries = file_paths
+    else:
+        # 目录模式（保留扫描时得到的文件大小，过滤时无需再次stat）
+        file_entries = file_scanner.scan_directory_entries(args.dir)
+        file_paths = file_scanner.paths(file_entries)
+
+    if not file_paths:
+        print("错误: 未找到有效的JSONL文件")
+        sys.exit(1)
+
     # 过滤文件大小
-    filtered_files = file_scanner.filter_by_size(file_paths, args.max_size)
+    filtered_files = list(file_scanner.filter_by_size(file_entries, args.max_size))
     if not filtered_files:
         print("错误: 所有文件都超过大小限制")
         sys.exit(1)
@@ -240,7 +264,7 @@ def main():
     print("="*60)
 
     parser = JSONLParser(max_size_mb=args.max_size)
-    records, errors = parser.parse_multiple_files(filtered_files)
+    records, errors = parser.parse_multiple_files(filtered_files, validate=not args.no_validate)
 
     if not records:
         print("错误: 未解析到有效记录")
@@ -252,47 +276,13 @@ def main():
 
     if errors:
         print(f"\n警告: 遇到 {len(errors)} 个解析错误")
-        # 仅进行威胁情报查询
-        from threat_intel_client import ThreatIntelClient
-
-        print("\n" + "="*60)
-        print("威胁情报查询...")
-        print("="*60)
-
-        client = ThreatIntelClient(config)
-        if not client.is_enabled():
-            print("警告: 威胁情报未启用或未配置API密钥")
-            if args.check_ip:
-                # 查询单个IP
-                result = client.check_ip(args.check_ip)
-                if result.get('success'):
-                    data = result['data']
-                    print(f"\nIP: {args.check_ip}")
-                    print(f"威胁类型: {', '.join(data.get('threatTypes', ['未知']))}")
-                    print(f"置信度: {data.get('abuseConfidenceScore', 0)}/100")
-                    print(f"国家: {data.get('countryName', 'Unknown')}")
-                    print(f"报告次数: {data.get('totalReports', 0)}")
-                else:
-                    print(f"查询失败: {result.get('error', '未知错误')}")
-            elif args.check_ip_range:
-                # 查询IP段
-                print(f"查询IP段: {args.check_ip_range}")
-                results = client.check_ip_range(args.check_ip_range)
-                if results:
-                    total = len(results)
-                    malicious = sum(1 for r in results if r.get('success') and r['data'].get('abuseConfidenceScore', 0) >= 80)
-                    print(f"查询完成: {total}个IP, {malicious}个恶意IP")
-                else:
-                    print("查询失败")
-
-        sys.exit(0)
 
     # 分析日志数据
     print("\n" + "="*60)
     print("分析日志数据...")
     print("="*60)
 
-    analyzer = LogAnalyzer()
+    analyzer = LogAnalyzer(config)
 
     # 根据参数选择分析方法
     if args.no_threat_intel:
@@ -312,11 +302,27 @@ def main():
         api_key = config.get_api_key()
 
         if api_key:
+            from src.ai_client import get_ai_client
+
             provider_config = ai_providers_config.get_provider(ai_provider)
             if provider_config:
-                ai_client = get_ai_client(ai_provider, api_key, provider_config)
+                cache_dir = None if args.no_cache else config.get('ai.cache_dir', '.cache/ai')
+                ai_client = get_ai_client(ai_provider, api_key, provider_config, cache_dir)
                 if ai_client:
-                    ai_analysis = ai_client.analyze_logs(analysis_result)
+                    # 流式输出：边生成边显示，结束后汇总为完整文本写入报告
+                    parts = []
+                    try:
+                        chunks = ai_client.analyze_logs(analysis_result, stream=True)
+                        if chunks is not None:
+                            for chunk in chunks:
+                                print(chunk, end='', flush=True)
+                                parts.append(chunk)
+                    except Exception as e:
+                        # AI流式输出中断时保留已收到的部分，报告照常生成
+                        print(f"\n警告: AI分析中断 - {e}")
+                    finally:
+                        ai_client.close()
+                    ai_analysis = "".join(parts) or None
             else:
                 print(f"警告: 未找到AI提供商配置 - {ai_provider}")
         else:
@@ -328,19 +334,21 @@ def main():
     print("生成分析报告...")
     print("="*60)
 
+    # 报告直接写入文件，不在内存中保留完整报告
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_filename = f"network_analysis_report_{timestamp}.md"
+    report_path = os.path.join(output_dir, report_filename)
+
     reporter = MarkdownReporter()
-    report_content = reporter.generate_report(
+    saved = reporter.generate_report_to_file(
+        report_path,
         analysis_result=analysis_result,
         ai_analysis=ai_analysis,
         file_info=file_scanner.get_file_info(file_paths[0]) if len(file_paths) == 1 else None
     )
-
-    # 保存报告
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    report_filename = f"network_analysis_report_{timestamp}.md"
-    report_path = os.path.join(output_dir, report_filename)
-
-    reporter.save_report(report_path)
+    if not saved:
+        print(f"错误: 报告未能保存到 {report_path}")
+        sys.exit(1)
 
     # 打印摘要
     print("\n" + "="*60)
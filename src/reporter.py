@@ -3,9 +3,37 @@
 
 负责生成Markdown格式的分析报告
 """
-from typing import Dict, Any, Optional
+import io
+import os
+from functools import lru_cache
+from typing import Dict, Any, TextIO
 from datetime import datetime
 
+# 风险等级对应的标识
+_RISK_EMOJI = {"低": "🟢", "中": "🟡", "高": "🔴"}
+
+# 固定的章节标题与分隔线（预先拼好，与 _add_header / _add_horizontal_rule 输出一致）
+_H1_TITLE = "# Windows网络流量分析报告\n\n"
+_H2_METADATA = "## 报告信息\n\n"
+_H2_SUMMARY = "## 执行摘要\n\n"
+_H2_BASIC_STATS = "## 基础统计\n\n"
+_H2_TIME = "## 时间分布分析\n\n"
+_H2_PROCESS = "## 进程行为分析\n\n"
+_H2_IP = "## IP访问分析\n\n"
+_H2_PORT = "## 端口分析\n\n"
+_H2_USER = "## 用户分析\n\n"
+_H2_AI = "## AI安全分析\n\n"
+_H2_ANOMALIES = "## 异常检测\n\n"
+_H2_APPENDIX = "## 数据附录\n\n"
+_H2_THREAT_INTEL = "## 🚨 威胁情报详细报告\n\n"
+_HR = "---\n\n"
+
+
+@lru_cache(maxsize=16)
+def _sep_line(n: int) -> str:
+    """获取n列表格的分隔线"""
+    return "|" + "---|" * n + "\n"
+
 
 class MarkdownReporter:
     """Markdown报告生成器"""
@@ -13,6 +41,10 @@ class MarkdownReporter:
     def __init__(self):
         """初始化报告生成器"""
         self.report = ""
+        # 报告写入目标：各 _add_* 方法只调用 write()，避免字符串反复 += 的二次方拷贝
+        self._out: TextIO = io.StringIO()
+        # 进程路径到进程名的缓存
+        self._basename_cache: Dict[str, str] = {}
 
     def generate_report(self,
                        analysis_result: Dict[str, Any],
@@ -29,10 +61,63 @@ class MarkdownReporter:
         Returns:
             Markdown格式的报告字符串
         """
-        self.report = ""
+        self._out = io.StringIO()
+        self._write_sections(analysis_result, ai_analysis, file_info)
+
+        self.report = self._out.getvalue()
+        self._out = io.StringIO()
+        return self.report
+
+    def generate_report_to_file(self,
+                                file_path: str,
+                                analysis_result: Dict[str, Any],
+                                ai_analysis: str = None,
+                                file_info: Dict[str, Any] = None) -> bool:
+        """
+        生成报告并直接写入文件，不在内存中保留完整报告
 
+        Args:
+            file_path: 报告文件路径
+            analysis_result: 分析结果
+            ai_analysis: AI生成的分析文本
+            file_info: 文件信息
+
+        Returns:
+            True if 保存成功, False otherwise（仅文件读写失败时返回False，报告生成异常直接抛出）
+        """
+        try:
+            with open(file_path, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                self._out = f
+                self._write_sections(analysis_result, ai_analysis, file_info)
+        except OSError as e:
+            print(f"保存报告失败: {e}")
+            self._remove_partial(file_path)
+            return False
+        except BaseException:
+            # 生成报告出错：删除写了一半的文件，异常继续向上抛出
+            self._remove_partial(file_path)
+            raise
+        finally:
+            self._out = io.StringIO()
+
+        print(f"报告已保存: {file_path}")
+        return True
+
+    @staticmethod
+    def _remove_partial(file_path: str) -> None:
+        """删除未写完的报告文件（文件不存在或无法删除时忽略）"""
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def _write_sections(self,
+                        analysis_result: Dict[str, Any],
+                        ai_analysis: str = None,
+                        file_info: Dict[str, Any] = None):
+        """依次写入报告各部分"""
         # 报告标题
-        self._add_header(1, "Windows网络流量分析报告")
+        self._out.write(_H1_TITLE)
         self._add_horizontal_rule()
         self._add_metadata(file_info)
 
@@ -74,44 +159,59 @@ class MarkdownReporter:
         # 报告页脚
         self._add_footer()
 
-        return self.report
-
     def _add_header(self, level: int, text: str):
         """添加标题"""
         prefix = "#" * level
-        self.report += f"{prefix} {text}\n\n"
+        self._out.write(f"{prefix} {text}\n\n")
 
     def _add_horizontal_rule(self):
         """添加水平线"""
-        self.report += "---\n\n"
+        self._out.write(_HR)
 
     def _add_text(self, text: str):
         """添加文本段落"""
-        self.report += f"{text}\n\n"
+        self._out.write(f"{text}\n\n")
 
     def _add_list_item(self, level: int, text: str):
         """添加列表项"""
         prefix = "  " * level + "-"
-        self.report += f"{prefix} {text}\n"
+        self._out.write(f"{prefix} {text}\n")
 
     def _add_table(self, headers: list, rows: list):
         """添加表格"""
         # 表头
-        self.report += "| " + " | ".join(headers) + " |\n"
+        self._out.write("| " + " | ".join(headers) + " |\n")
         # 分隔线
-        self.report += "|" + "|".join(["---"] * len(headers)) + "|\n"
+        self._out.write(_sep_line(len(headers)))
         # 数据行
         for row in rows:
-            self.report += "| " + " | ".join(str(cell) for cell in row) + " |\n"
-        self.report += "\n"
+            # 已是字符串的单元格无需再调用 str()
+            self._out.write("| " + " | ".join([cell if type(cell) is str else str(cell) for cell in row]) + " |\n")
+        self._out.write("\n")
 
     def _add_code_block(self, code: str, language: str = ""):
         """添加代码块"""
-        self.report += f"```{language}\n{code}\n```\n\n"
+        self._out.write(f"```{language}\n{code}\n```\n\n")
+
+    def _basename(self, process: str) -> str:
+        """
+        获取进程路径中的进程名（带缓存）
+
+        Args:
+            process: 进程路径
+
+        Returns:
+            进程名，如 svchost.exe
+        """
+        name = self._basename_cache.get(process)
+        if name is None:
+            # 无反斜杠时 rpartition 返回 ('', '', process)，直接得到原字符串
+            name = self._basename_cache[process] = process.rpartition('\\')[2]
+        return name
 
     def _add_metadata(self, file_info: Dict[str, Any]):
         """添加报告元数据"""
-        self._add_header(2, "报告信息")
+        self._out.write(_H2_METADATA)
 
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self._add_list_item(0, f"生成时间: {now}")
@@ -125,7 +225,7 @@ class MarkdownReporter:
 
     def _add_summary(self, analysis_result: Dict[str, Any], ai_analysis: str = None):
         """添加执行摘要"""
-        self._add_header(2, "执行摘要")
+        self._out.write(_H2_SUMMARY)
 
         summary = analysis_result['summary']
         self._add_list_item(0, f"总连接数: **{summary['total_count']:,}**")
@@ -136,18 +236,22 @@ class MarkdownReporter:
         # 风险评估
         anomalies = analysis_result['anomalies']
         risk_level = self._calculate_risk_level(anomalies)
-        risk_emoji = {"低": "🟢", "中": "🟡", "高": "🔴"}.get(risk_level, "⚪")
+        risk_emoji = _RISK_EMOJI.get(risk_level, "⚪")
 
         self._add_text(f"\n**风险评估: {risk_emoji} {risk_level}风险**")
 
         # 关键发现
+        high_risk_count = len(anomalies['high_risk_port_connections'])
+        abnormal_time_count = anomalies['abnormal_time_count']
+        suspicious_count = len(anomalies['suspicious_process_ips'])
+
         key_findings = []
-        if anomalies['high_risk_port_connections']:
-            key_findings.append(f"发现 {len(anomalies['high_risk_port_connections'])} 个高危端口连接")
-        if anomalies['abnormal_time_count'] > 0:
-            key_findings.append(f"检测到 {anomalies['abnormal_time_count']} 个异常时间段连接")
-        if anomalies['suspicious_process_ips']:
-            key_findings.append(f"发现 {len(anomalies['suspicious_process_ips'])} 个可疑进程访问多个外网IP")
+        if high_risk_count:
+            key_findings.append(f"发现 {high_risk_count} 个高危端口连接")
+        if abnormal_time_count > 0:
+            key_findings.append(f"检测到 {abnormal_time_count} 个异常时间段连接")
+        if suspicious_count:
+            key_findings.append(f"发现 {suspicious_count} 个可疑进程访问多个外网IP")
 
         if key_findings:
             self._add_header(3, "关键发现")
@@ -158,21 +262,25 @@ class MarkdownReporter:
 
     def _calculate_risk_level(self, anomalies: Dict[str, Any]) -> str:
         """计算风险等级"""
+        high_risk_count = len(anomalies['high_risk_port_connections'])
+        abnormal_time_count = anomalies['abnormal_time_count']
+        suspicious_count = len(anomalies['suspicious_process_ips'])
+
         score = 0
 
-        if len(anomalies['high_risk_port_connections']) > 5:
+        if high_risk_count > 5:
             score += 2
-        elif len(anomalies['high_risk_port_connections']) > 0:
+        elif high_risk_count > 0:
             score += 1
 
-        if anomalies['abnormal_time_count'] > 50:
+        if abnormal_time_count > 50:
             score += 2
-        elif anomalies['abnormal_time_count'] > 0:
+        elif abnormal_time_count > 0:
             score += 1
 
-        if len(anomalies['suspicious_process_ips']) > 2:
+        if suspicious_count > 2:
             score += 2
-        elif len(anomalies['suspicious_process_ips']) > 0:
+        elif suspicious_count > 0:
             score += 1
 
         if score >= 4:
@@ -184,7 +292,7 @@ class MarkdownReporter:
 
     def _add_basic_statistics(self, analysis_result: Dict[str, Any]):
         """添加基础统计"""
-        self._add_header(2, "基础统计")
+        self._out.write(_H2_BASIC_STATS)
 
         proto = analysis_result['protocol_analysis']
         self._add_header(3, "协议分布")
@@ -205,7 +313,7 @@ class MarkdownReporter:
 
     def _add_time_analysis(self, analysis_result: Dict[str, Any]):
         """添加时间分析"""
-        self._add_header(2, "时间分布分析")
+        self._out.write(_H2_TIME)
 
         time_info = analysis_result['time_analysis']
         time_range = time_info['time_range']
@@ -243,7 +351,7 @@ class MarkdownReporter:
 
     def _add_process_analysis(self, analysis_result: Dict[str, Any]):
         """添加进程分析"""
-        self._add_header(2, "进程行为分析")
+        self._out.write(_H2_PROCESS)
 
         proc = analysis_result['process_analysis']
 
@@ -256,29 +364,30 @@ class MarkdownReporter:
         if proc['top_processes']:
             self._add_header(3, "Top 10 活跃进程")
             for process, count in proc['top_processes']:
-                process_name = process.split('\\')[-1] if '\\' in process else process
+                process_name = self._basename(process)
                 self._add_list_item(0, f"**{process_name}**: {count} 次连接")
 
         # 特权进程外网访问
         if proc.get('privileged_external_connections'):
             self._add_header(3, "特权进程外网访问")
             for process, count in proc['privileged_external_connections'][:5]:
-                process_name = process.split('\\')[-1] if '\\' in process else process
+                process_name = self._basename(process)
                 self._add_list_item(0, f"**{process_name}**: {count} 个外网IP")
 
         self._add_horizontal_rule()
 
     def _add_ip_analysis(self, analysis_result: Dict[str, Any]):
         """添加IP地址分析"""
-        self._add_header(2, "IP访问分析")
+        self._out.write(_H2_IP)
 
         ip = analysis_result['ip_analysis']
 
         # Top IP
         if ip['top_ips']:
             self._add_header(3, "Top 10 访问的IP地址")
+            threat_by_ip = self._get_threat_lookup(analysis_result)
             for ip_addr, count in ip['top_ips']:
-                threat_info = self._get_threat_info(ip_addr, analysis_result)
+                threat_info = threat_by_ip.get(ip_addr)
                 if threat_info:
                     self._add_list_item(0, f"**{ip_addr}** ⚠️: {count} 次连接 - *威胁类型: {threat_info['threat_type']}*")
                 else:
@@ -291,7 +400,7 @@ class MarkdownReporter:
 
     def _add_port_analysis(self, analysis_result: Dict[str, Any]):
         """添加端口分析"""
-        self._add_header(2, "端口分析")
+        self._out.write(_H2_PORT)
 
         port = analysis_result['port_analysis']
 
@@ -303,9 +412,11 @@ class MarkdownReporter:
         # Top 端口
         if port['top_ports']:
             self._add_header(3, "Top 10 访问端口")
+            port_details = port['port_details']
             for port_num, count in port['top_ports']:
-                service = port['port_details'].get(port_num, {}).get('service', '未知')
-                is_high_risk = port['port_details'].get(port_num, {}).get('is_high_risk', False)
+                detail = port_details.get(port_num, {})
+                service = detail.get('service', '未知')
+                is_high_risk = detail.get('is_high_risk', False)
                 risk_mark = " ⚠️" if is_high_risk else ""
                 self._add_list_item(0, f"端口 **{port_num}** ({service}){risk_mark}: {count} 次连接")
 
@@ -318,7 +429,7 @@ class MarkdownReporter:
 
     def _add_user_analysis(self, analysis_result: Dict[str, Any]):
         """添加用户分析"""
-        self._add_header(2, "用户分析")
+        self._out.write(_H2_USER)
 
         user = analysis_result['user_analysis']
 
@@ -336,7 +447,7 @@ class MarkdownReporter:
 
     def _add_ai_analysis(self, ai_analysis: str):
         """添加AI分析结果"""
-        self._add_header(2, "AI安全分析")
+        self._out.write(_H2_AI)
 
         # 将AI分析转换为Markdown格式
         ai_analysis_md = ai_analysis.replace('\n\n', '\n\n')
@@ -346,7 +457,7 @@ class MarkdownReporter:
 
     def _add_anomalies(self, analysis_result: Dict[str, Any]):
         """添加异常检测结果"""
-        self._add_header(2, "异常检测")
+        self._out.write(_H2_ANOMALIES)
 
         anomalies = analysis_result['anomalies']
 
@@ -354,29 +465,30 @@ class MarkdownReporter:
         if anomalies['high_risk_port_connections']:
             self._add_header(3, "高危端口连接")
             for conn in anomalies['high_risk_port_connections'][:10]:
-                process_name = conn['process'].split('\\')[-1] if '\\' in conn['process'] else conn['process']
+                process_name = self._basename(conn['process'])
                 self._add_list_item(0, f"{process_name} -> {conn['dest_ip']}:{conn['dest_port']} ({conn['service']})")
 
         # 可疑进程
         if anomalies['suspicious_process_ips']:
             self._add_header(3, "可疑进程（访问大量外网IP）")
             for item in anomalies['suspicious_process_ips'][:5]:
-                process_name = item['process'].split('\\')[-1] if '\\' in item['process'] else item['process']
+                process_name = self._basename(item['process'])
                 self._add_list_item(0, f"**{process_name}**: 访问了 {item['external_ip_count']} 个不同外网IP")
 
         self._add_horizontal_rule()
 
     def _add_appendix(self, analysis_result: Dict[str, Any]):
         """添加数据附录"""
-        self._add_header(2, "数据附录")
+        self._out.write(_H2_APPENDIX)
 
         # 完整的端口列表
         port = analysis_result['port_analysis']
-        if port['port_details']:
+        port_details = port['port_details']
+        if port_details:
             self._add_header(3, "完整端口访问统计")
+            service_map = {p: d.get('service', '未知') for p, d in port_details.items()}
             for port_num, count in port['top_ports']:
-                service = port['port_details'].get(port_num, {}).get('service', '未知')
-                self._add_list_item(0, f"{port_num} ({service}): {count}")
+                self._add_list_item(0, f"{port_num} ({service_map.get(port_num, '未知')}): {count}")
 
         self._add_horizontal_rule()
 
@@ -386,29 +498,25 @@ class MarkdownReporter:
         self._add_text("*本报告由 Windows网络流量智能分析工具 自动生成*")
         self._add_text("*生成时间: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "*")
 
-    def _get_threat_info(self, ip_addr: str, analysis_result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def _get_threat_lookup(self, analysis_result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
         """
-        获取指定IP的威胁情报信息
+        构建恶意IP到威胁情报信息的索引
 
         Args:
-            ip_addr: IP地址
             analysis_result: 分析结果
 
         Returns:
-            威胁信息字典，如果不存在则返回None
+            IP地址到威胁信息字典的映射
         """
-        if 'threat_intel' in analysis_result:
-            for threat in analysis_result['threat_intel'].get('malicious_ips', []):
-                if threat['ip'] == ip_addr:
-                    return threat
-        return None
+        threat_intel = analysis_result.get('threat_intel') or {}
+        return {threat['ip']: threat for threat in threat_intel.get('malicious_ips', [])}
 
     def _add_threat_intel_detailed(self, threat_intel: Dict[str, Any]):
         """添加详细的威胁情报报告"""
         if not threat_intel.get('summary'):
             return
 
-        self._add_header(2, "🚨 威胁情报详细报告")
+        self._out.write(_H2_THREAT_INTEL)
 
         # 威胁概览
         summary = threat_intel['summary']
@@ -420,32 +528,37 @@ class MarkdownReporter:
 
         # 风险等级
         risk_level = summary['risk_level']
-        risk_emoji = {"高": "🔴", "中": "🟡", "低": "🟢"}.get(risk_level, "⚪")
+        risk_emoji = _RISK_EMOJI.get(risk_level, "⚪")
         self._add_text(f"\n**整体风险等级: {risk_emoji} {risk_level}**")
 
         # 恶意IP详情
         if threat_intel['malicious_ips']:
             self._add_header(3, "🔴 恶意IP详情")
+            # 每个IP的列表块拼成一个字符串后一次写入（末尾空段落与 _add_text("") 一致）
             for threat in threat_intel['malicious_ips']:
-                self._add_list_item(0, f"**{threat['ip']}**")
-                self._add_list_item(1, f"威胁类型: {threat['threat_type']}")
-                self._add_list_item(1, f"置信度: {threat['confidence_score']}/100")
-                self._add_list_item(1, f"国家: {threat['country']}")
-                self._add_list_item(1, f"报告次数: {threat['total_reports']}")
-                self._add_list_item(1, f"首次发现: {threat['first_reported']}")
-                self._add_list_item(1, f"最后发现: {threat['last_reported']}")
-                self._add_text("")
+                self._out.write(
+                    f"- **{threat['ip']}**\n"
+                    f"  - 威胁类型: {threat['threat_type']}\n"
+                    f"  - 置信度: {threat['confidence_score']}/100\n"
+                    f"  - 国家: {threat['country']}\n"
+                    f"  - 报告次数: {threat['total_reports']}\n"
+                    f"  - 首次发现: {threat['first_reported']}\n"
+                    f"  - 最后发现: {threat['last_reported']}\n"
+                    "\n\n"
+                )
 
         # 可疑IP详情
         if threat_intel['suspicious_ips']:
             self._add_header(3, "🟡 可疑IP详情")
             for threat in threat_intel['suspicious_ips']:
-                self._add_list_item(0, f"**{threat['ip']}**")
-                self._add_list_item(1, f"威胁类型: {threat['threat_type']}")
-                self._add_list_item(1, f"置信度: {threat['confidence_score']}/100")
-                self._add_list_item(1, f"国家: {threat['country']}")
-                self._add_list_item(1, f"报告次数: {threat['total_reports']}")
-                self._add_text("")
+                self._out.write(
+                    f"- **{threat['ip']}**\n"
+                    f"  - 威胁类型: {threat['threat_type']}\n"
+                    f"  - 置信度: {threat['confidence_score']}/100\n"
+                    f"  - 国家: {threat['country']}\n"
+                    f"  - 报告次数: {threat['total_reports']}\n"
+                    "\n\n"
+                )
 
         # 错误信息
         if threat_intel['errors']:
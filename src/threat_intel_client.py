@@ -4,13 +4,96 @@
 负责与AbuseIPDB API交互，查询IP威胁情报
 """
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import ipaddress
-from typing import List, Dict, Any, Optional, Union
+import socket
+import hashlib
+import json
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterator, List, Dict, Any, Optional, Union
 from datetime import datetime
 import time
 import os
 from src.config import Config
 
+# 响应解析：优先orjson（直接解析字节，无需先解码为str），未安装时回退到标准库json
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# 进程内查询结果缓存的最大条目数（超出后淘汰最久未使用的条目）
+_MEMORY_CACHE_SIZE = 50_000
+
+# AbuseIPDB 返回的剩余配额（X-RateLimit-Remaining）不高于此值时进一步降速，
+# 相邻两次请求至少间隔 _LOW_QUOTA_INTERVAL 秒
+_QUOTA_HEADROOM = 100
+_LOW_QUOTA_INTERVAL = 1.0
+
+
+@lru_cache(maxsize=256)
+def _join_threat_types(threat_types: tuple, default: str) -> str:
+    """
+    拼接威胁类型标签（带缓存，大量IP的威胁类型组合通常重复）
+
+    Args:
+        threat_types: 威胁类型元组
+        default: 无威胁类型时使用的标签
+
+    Returns:
+        逗号分隔的威胁类型字符串
+    """
+    return ', '.join(threat_types) if threat_types else default
+
+
+def _iter_host_strs(network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> Iterator[str]:
+    """
+    按顺序生成网络中可用主机的地址字符串（与 network.hosts() 结果一致）
+
+    IPv4直接按整数区间生成点分地址，不构造IPv4Address对象；/31、/32包含全部地址，
+    其余网段跳过网络地址与广播地址。
+
+    Args:
+        network: IP网络对象
+
+    Returns:
+        主机地址字符串迭代器
+    """
+    if network.version != 4:
+        return map(str, network.hosts())
+
+    start = int(network.network_address)
+    end = int(network.broadcast_address) + 1
+    if network.prefixlen < 31:
+        start += 1
+        end -= 1
+    return (socket.inet_ntoa(ip_int.to_bytes(4, 'big')) for ip_int in range(start, end))
+
+
+@lru_cache(maxsize=16384)
+def _is_internal_ip(ip: str) -> bool:
+    """
+    检查是否是内部IP（带缓存，同一IP在多次分析中只解析一次）
+
+    Args:
+        ip: IP地址字符串
+
+    Returns:
+        True if 内网/回环地址或无法解析, False otherwise
+    """
+    try:
+        ip_obj = ipaddress.ip_address(ip)
+        return ip_obj.is_private or ip_obj.is_loopback
+    except ValueError:
+        return True
+
 
 class ThreatIntelClient:
     """威胁情报查询客户端"""
@@ -25,7 +108,37 @@ class ThreatIntelClient:
         self.config = config
         self.api_key = self._get_api_key()
         self.base_url = "https://api.abuseipdb.com/api/v2"
+        # 并发线程数至少为1（配置为0或负数时按1处理）
+        concurrency = max(1, int(config.get('threat_intel.concurrency', 8) or 1))
+
+        # 复用连接池：池大小与并发线程数一致，避免并发查询时连接被反复丢弃重建；
+        # 429/5xx及连接错误交给传输层指数退避重试，并遵循Retry-After
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(concurrency, 10), max_retries=retry)
         self.session = requests.Session()
+        self.session.mount('https://', adapter)
+
+        # 查询结果缓存：进程内LRU + 磁盘文件，两级共用同一过期时间，cache_dir为空时不落盘
+        self.cache_dir = config.get('threat_intel.cache_dir', '.cache/threat_intel')
+        self.cache_ttl = config.get('threat_intel.cache_ttl_seconds', 86400)
+        # 缓存键 -> (缓存时间, 结果)
+        self._memory_cache: OrderedDict = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # 并发查询：线程池 + 所有工作线程共享的滑动窗口限速器
+        # （任意1秒内最多 rate_limit_per_second 个请求，剩余配额不足时进一步降速）
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        rate = config.get('threat_intel.rate_limit_per_second', 10)
+        self._request_times: Optional[deque] = deque(maxlen=int(rate)) if rate and rate >= 1 else None
+        self._quota_remaining: Optional[int] = None
+        self._last_send_at = 0.0
+        self._rate_lock = threading.Lock()
 
         # 设置请求头
         if self.api_key:
@@ -62,55 +175,186 @@ class ThreatIntelClient:
                 'query_time': datetime.now().isoformat()
             }
 
+        max_age = self._get_max_age()
+        verbose = self._get_verbose()
+        cache_key = f"{ip}|{max_age}|{verbose}"
+        cached = self._read_cache(cache_key)
+        if cached is not None:
+            return cached
+
+        # 本次查询的时间戳只取一次，成功与失败结果共用
+        query_time = datetime.now().isoformat()
+
         try:
-            # 验证IP格式
-            ip_obj = ipaddress.ip_address(ip)
-            version = 'v4' if isinstance(ip_obj, ipaddress.IPv4Address) else 'v6'
+            # 验证IP格式（inet_pton为C实现，比构造ipaddress对象快得多）
+            family = socket.AF_INET if '.' in ip and ':' not in ip else socket.AF_INET6
+            try:
+                socket.inet_pton(family, ip)
+            except OSError:
+                raise ValueError(f"'{ip}' does not appear to be an IPv4 or IPv6 address")
 
             # 构建请求
             url = f"{self.base_url}/check"
             params = {
                 'ipAddress': ip,
-                'maxAgeDays': self._get_max_age(),
-                'verbose': self._get_verbose()
+                'maxAgeDays': max_age,
+                'verbose': verbose
             }
 
             # 发送请求
+            self._wait_for_rate_limit()
             response = self.session.get(url, params=params, timeout=30)
+            self._update_quota(response)
             response.raise_for_status()
 
-            # 解析响应
-            data = response.json()
+            # 解析响应（结果中只保留响应体的 data 对象，与各调用方读取的字段层级一致）
+            data = _loads(response.content)
             self._normalize_response(data)
 
-            return {
+            result = {
                 'ip': ip,
-                'data': data,
+                'data': data.get('data', data),
                 'success': True,
-                'query_time': datetime.now().isoformat()
+                'query_time': query_time
             }
+            self._write_cache(cache_key, result)
+            return result
 
         except requests.exceptions.RequestException as e:
             return {
                 'ip': ip,
                 'error': f'Request failed: {str(e)}',
                 'success': False,
-                'query_time': datetime.now().isoformat()
+                'query_time': query_time
             }
         except Exception as e:
             return {
                 'ip': ip,
                 'error': f'Unexpected error: {str(e)}',
                 'success': False,
-                'query_time': datetime.now().isoformat()
+                'query_time': query_time
             }
 
-    def check_ip_range(self, ip_range: str) -> List[Dict[str, Any]]:
+    def _wait_for_rate_limit(self) -> None:
+        """
+        按滑动窗口为当前请求分配发送时间，只在窗口已满时等待（线程安全）
+
+        窗口内记录最近 rate_limit_per_second 次请求的发送时间，最早一次距今不足1秒时
+        等到它滑出窗口为止；API返回的剩余配额不足时，在此基础上再保证相邻请求的最小间隔。
+        """
+        quota_low = self._quota_remaining is not None and self._quota_remaining <= _QUOTA_HEADROOM
+        if self._request_times is None and not quota_low:
+            return
+
+        with self._rate_lock:
+            now = time.monotonic()
+            send_at = now
+            request_times = self._request_times
+            if request_times is not None and len(request_times) == request_times.maxlen:
+                send_at = max(send_at, request_times[0] + 1.0)
+            if quota_low:
+                send_at = max(send_at, self._last_send_at + _LOW_QUOTA_INTERVAL)
+            # 先占用发送时间，其他线程据此排在后面
+            if request_times is not None:
+                request_times.append(send_at)
+            self._last_send_at = send_at
+
+        if send_at > now:
+            time.sleep(send_at - now)
+
+    def _update_quota(self, response) -> None:
+        """根据响应头记录剩余配额"""
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        try:
+            self._quota_remaining = int(remaining)
+        except (TypeError, ValueError):
+            pass
+
+    def _cache_path(self, cache_key: str) -> str:
+        """获取缓存键对应的缓存文件路径"""
+        digest = hashlib.sha256(cache_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def _read_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取未过期的缓存查询结果（先查进程内LRU，再查磁盘）
+
+        Args:
+            cache_key: 缓存键（IP|最大天数|详细模式）
+
+        Returns:
+            缓存的查询结果，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._cache_lock:
+            entry = self._memory_cache.get(cache_key)
+            if entry is not None:
+                if now - entry[0] < self.cache_ttl:
+                    self._memory_cache.move_to_end(cache_key)
+                    return entry[1]
+                del self._memory_cache[cache_key]
+
+        if not self.cache_dir:
+            return None
+
+        try:
+            with open(self._cache_path(cache_key), 'rb') as f:
+                entry = _loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+        cached_at = entry.get('cached_at', 0)
+        if now - cached_at >= self.cache_ttl:
+            return None
+
+        result = entry.get('result')
+        if result is not None:
+            self._remember(cache_key, cached_at, result)
+        return result
+
+    def _remember(self, cache_key: str, cached_at: float, result: Dict[str, Any]) -> None:
+        """放入进程内LRU缓存，超出容量时淘汰最久未使用的条目"""
+        with self._cache_lock:
+            self._memory_cache[cache_key] = (cached_at, result)
+            self._memory_cache.move_to_end(cache_key)
+            if len(self._memory_cache) > _MEMORY_CACHE_SIZE:
+                self._memory_cache.popitem(last=False)
+
+    def _write_cache(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """
+        缓存成功的查询结果（磁盘文件原子写入：先写临时文件再替换）
+
+        Args:
+            cache_key: 缓存键
+            result: 查询结果
+        """
+        cached_at = time.time()
+        self._remember(cache_key, cached_at, result)
+        if not self.cache_dir:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'cached_at': cached_at, 'result': result}, f, ensure_ascii=False)
+                os.replace(tmp_path, self._cache_path(cache_key))
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except (OSError, TypeError, ValueError) as e:
+            print(f"警告: 写入威胁情报缓存失败 - {e}")
+
+    def check_ip_range(self, ip_range: str, skip: Optional[set] = None) -> List[Dict[str, Any]]:
         """
         查询IP段的威胁情报
 
         Args:
             ip_range: IP段，格式如 "127.0.0.1/24"
+            skip: 已查询过的IP集合，集合中的IP不再查询，新查询的IP会被加入集合
 
         Returns:
             查询结果列表
@@ -129,15 +373,25 @@ class ThreatIntelClient:
             network = ipaddress.ip_network(ip_range, strict=False)
 
             # 根据段大小决定查询策略
+            if self._use_check_block(network):
+                # check-block 一次请求返回整段中被报告过的IP，失败时退回逐个查询
+                block_results = self._check_block(network, skip)
+                if block_results is not None:
+                    return block_results
+
             if network.num_addresses <= 256:
-                # 小段，逐个查询
-                for ip in network.hosts():
-                    result = self.check_ip(str(ip))
-                    results.append(result)
-                    time.sleep(0.1)  # 避免API限速
+                # 小段，并发查询全部主机
+                ip_strs = []
+                for ip_str in _iter_host_strs(network):
+                    if skip is not None:
+                        if ip_str in skip:
+                            continue
+                        skip.add(ip_str)
+                    ip_strs.append(ip_str)
+                results = self.check_ips(ip_strs)
             else:
                 # 大段，使用批量查询（取前256个主机）
-                results = self._query_large_network(network)
+                results = self._query_large_network(network, skip)
 
             return results
 
@@ -149,29 +403,120 @@ class ThreatIntelClient:
                 'query_time': datetime.now().isoformat()
             }]
 
-    def _query_large_network(self, network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> List[Dict[str, Any]]:
+    def _use_check_block(self, network: ipaddress.IPv4Network | ipaddress.IPv6Network) -> bool:
+        """判断IP段是否使用 check-block 接口整段查询（仅IPv4，且段大小在账户套餐允许范围内）"""
+        if not self.config.get('threat_intel.use_check_block', True):
+            return False
+        return network.version == 4 and network.prefixlen >= self.config.get('threat_intel.check_block_min_prefix', 24)
+
+    def _check_block(self, network: ipaddress.IPv4Network,
+                     skip: Optional[set] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        通过 check-block 接口一次查询整个IP段
+
+        接口只返回被报告过的IP，段内其余主机按置信度0处理，不再单独请求。
+
+        Args:
+            network: IPv4网络对象
+            skip: 已查询过的IP集合，含义同check_ip_range
+
+        Returns:
+            与check_ip结果格式一致的查询结果列表，请求失败时返回None
+        """
+        query_time = datetime.now().isoformat()
+        max_age = self._get_max_age()
+
+        # 整段的查询结果（被报告过的IP -> 数据）同样进入缓存，重复扫描同一IP段时不再请求
+        cache_key = f"block|{network}|{max_age}"
+        reported = self._read_cache(cache_key)
+        if reported is None:
+            try:
+                self._wait_for_rate_limit()
+                response = self.session.get(
+                    f"{self.base_url}/check-block",
+                    params={'network': str(network), 'maxAgeInDays': max_age},
+                    timeout=30
+                )
+                self._update_quota(response)
+                response.raise_for_status()
+                block = _loads(response.content).get('data', {})
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"警告: check-block 查询 {network} 失败，改为逐个IP查询 - {e}")
+                return None
+
+            # 被报告过的IP，字段名转换为 check 接口的格式
+            reported = {}
+            for entry in block.get('reportedAddress', []):
+                reported[entry.get('ipAddress')] = {
+                    'ipAddress': entry.get('ipAddress'),
+                    'abuseConfidenceScore': entry.get('abuseConfidenceScore', 0),
+                    'countryCode': entry.get('countryCode'),
+                    'totalReports': entry.get('numReports', 0),
+                    'lastReportedAt': entry.get('mostRecentReport'),
+                    'isPublic': True
+                }
+            self._write_cache(cache_key, reported)
+
+        results = []
+        for ip_str in _iter_host_strs(network):
+            if skip is not None:
+                if ip_str in skip:
+                    continue
+                skip.add(ip_str)
+            data = reported.get(ip_str) or {
+                'ipAddress': ip_str,
+                'abuseConfidenceScore': 0,
+                'totalReports': 0,
+                'isPublic': True
+            }
+            results.append({
+                'ip': ip_str,
+                'data': data,
+                'success': True,
+                'query_time': query_time
+            })
+
+        return results
+
+    def _query_large_network(self, network: ipaddress.IPv4Network | ipaddress.IPv6Network,
+                             skip: Optional[set] = None) -> List[Dict[str, Any]]:
         """
         查询大型网络的威胁情报（简化版，返回前256个IP）
 
         Args:
             network: IP网络对象
+            skip: 已查询过的IP集合，含义同check_ip_range
 
         Returns:
             查询结果列表
         """
-        results = []
-        ip_count = 0
+        ip_strs = []
 
-        for ip in network.hosts():
-            if ip_count >= 256:  # 限制查询数量
+        for ip_str in _iter_host_strs(network):
+            if len(ip_strs) >= 256:  # 限制查询数量
                 break
 
-            result = self.check_ip(str(ip))
-            results.append(result)
-            ip_count += 1
-            time.sleep(0.1)  # 避免API限速
+            if skip is not None:
+                if ip_str in skip:
+                    continue
+                skip.add(ip_str)
+            ip_strs.append(ip_str)
 
-        return results
+        return self.check_ips(ip_strs)
+
+    def check_ips(self, ip_strs: List[str]) -> List[Dict[str, Any]]:
+        """
+        通过线程池并发查询多个IP（由限速器控制请求速率）
+
+        Args:
+            ip_strs: IP地址字符串列表
+
+        Returns:
+            查询结果列表，顺序与输入一致
+        """
+        if len(ip_strs) <= 1:
+            return [self.check_ip(ip) for ip in ip_strs]
+        return list(self._executor.map(self.check_ip, ip_strs))
 
     def _normalize_response(self, data: Dict[str, Any]):
         """标准化API响应格式"""
@@ -195,6 +540,11 @@ class ThreatIntelClient:
         """检查是否启用威胁情报功能"""
         return self.config.get('threat_intel.enabled', False) and bool(self.api_key)
 
+    def close(self) -> None:
+        """关闭查询线程池与底层HTTP会话，释放连接池"""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
 
 class ThreatIntelAnalyzer:
     """威胁情报分析器"""
@@ -228,18 +578,27 @@ class ThreatIntelAnalyzer:
             'summary': {}
         }
 
-        # 查询单个IP
+        # 已查询过的IP，重复出现（包括落在IP段内）的不再查询
+        seen = set()
+
+        # 查询单个IP：先去重并过滤内网IP，再整批交给线程池并发查询
+        ip_strs = []
         for ip in ips:
-            if not self._is_internal_ip(ip):
-                result = self.client.check_ip(ip)
-                results['query_count'] += 1
-                self._process_result(result, results)
+            if ip in seen or _is_internal_ip(ip):
+                continue
+            seen.add(ip)
+            ip_strs.append(ip)
+
+        ip_results = self.client.check_ips(ip_strs)
+        results['query_count'] += len(ip_results)
+        for result in ip_results:
+            self._process_result(result, results)
 
         # 查询IP段
         if ip_ranges:
             for ip_range in ip_ranges:
                 if '/' in ip_range:  # 确保是有效的IP段
-                    range_results = self.client.check_ip_range(ip_range)
+                    range_results = self.client.check_ip_range(ip_range, skip=seen)
                     results['query_count'] += len(range_results)
                     for result in range_results:
                         self._process_result(result, results)
@@ -261,7 +620,7 @@ class ThreatIntelAnalyzer:
             if score >= 80:
                 results['malicious_ips'].append({
                     'ip': ip,
-                    'threat_type': ', '.join(threat_types) if threat_types else 'Malicious Activity',
+                    'threat_type': _join_threat_types(tuple(threat_types), 'Malicious Activity'),
                     'confidence_score': score,
                     'country': data.get('countryName', 'Unknown'),
                     'total_reports': data.get('totalReports', 0),
@@ -271,7 +630,7 @@ class ThreatIntelAnalyzer:
             elif score >= 30:
                 results['suspicious_ips'].append({
                     'ip': ip,
-                    'threat_type': ', '.join(threat_types) if threat_types else 'Suspicious Activity',
+                    'threat_type': _join_threat_types(tuple(threat_types), 'Suspicious Activity'),
                     'confidence_score': score,
                     'country': data.get('countryName', 'Unknown'),
                     'total_reports': data.get('totalReports', 0)
@@ -296,14 +655,6 @@ class ThreatIntelAnalyzer:
             'risk_level': self._calculate_risk_level(results)
         }
 
-    def _is_internal_ip(self, ip: str) -> bool:
-        """检查是否是内部IP"""
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            return ip_obj.is_private or ip_obj.is_loopback
-        except:
-            return True
-
     def _get_percentage(self, count: int, total: int) -> float:
         """计算百分比"""
         if total == 0:
@@ -4,6 +4,7 @@
 import sys
 import os
 import argparse
+from bisect import bisect_right
 from pathlib import Path
 from datetime import datetime
 
@@ -13,6 +14,35 @@ sys.path.insert(0, str(Path(__file__).parent))
 from src.config import Config
 from src.threat_intel_client import ThreatIntelClient
 
+# 风险等级阈值（按阈值降序），单IP结果与IP段摘要共用同一套划分
+RISK_THRESHOLDS = [(80, '高风险'), (30, '中风险'), (0, '低风险')]
+_RISK_BOUNDS = [threshold for threshold, _ in reversed(RISK_THRESHOLDS)]
+_RISK_LABELS = [label for _, label in reversed(RISK_THRESHOLDS)]
+
+
+def classify_risk(score) -> str:
+    """
+    按威胁置信度划分风险等级
+
+    Args:
+        score: AbuseIPDB威胁置信度（0-100）
+
+    Returns:
+        风险等级（高风险/中风险/低风险）
+    """
+    return _RISK_LABELS[max(bisect_right(_RISK_BOUNDS, score) - 1, 0)]
+
+
+def _positive_int(value: str) -> int:
+    """argparse类型：大于等于1的整数"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"必须是整数: {value}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须大于等于1: {value}")
+    return number
+
 
 def parse_args():
     """解析命令行参数"""
@@ -44,6 +74,12 @@ def parse_args():
         help='配置文件路径'
     )
 
+    parser.add_argument(
+        '--concurrency',
+        type=_positive_int,
+        help='IP段逐个查询时的并发线程数（覆盖配置 threat_intel.concurrency）'
+    )
+
     parser.add_argument(
         '--verbose',
         action='store_true',
@@ -94,13 +130,7 @@ def print_result(result: dict, verbose: bool = False):
             print(f"   - {usage_type}")
 
     # 风险评估
-    score = data.get('abuseConfidenceScore', 0)
-    if score >= 80:
-        risk_level = "高风险"
-    elif score >= 30:
-        risk_level = "中风险"
-    else:
-        risk_level = "低风险"
+    risk_level = classify_risk(data.get('abuseConfidenceScore', 0))
 
     print(f"\n风险评估: {risk_level}")
 
@@ -111,32 +141,42 @@ def print_range_summary(results: list, total_ips: int = None):
         print("没有查询结果")
         return
 
-    successful = [r for r in results if r.get('success')]
-    failed = [r for r in results if not r.get('success')]
+    # 一次遍历完成全部统计，失败详情只保留需要打印的前几条
+    successful = failed = 0
+    risk_counts = dict.fromkeys(_RISK_LABELS, 0)
+    failures = []
+    for r in results:
+        if r.get('success'):
+            successful += 1
+            risk_counts[classify_risk(r['data'].get('abuseConfidenceScore', 0))] += 1
+        else:
+            failed += 1
+            if len(failures) < 5:
+                failures.append(r)
+
+    malicious = risk_counts['高风险']
+    suspicious = risk_counts['中风险']
+    clean = risk_counts['低风险']
 
     if total_ips is None:
         total_ips = len(results)
 
-    malicious = sum(1 for r in successful if r['data'].get('abuseConfidenceScore', 0) >= 80)
-    suspicious = sum(1 for r in successful if 30 <= r['data'].get('abuseConfidenceScore', 0) < 80)
-    clean = sum(1 for r in successful if r['data'].get('abuseConfidenceScore', 0) < 30)
-
     print(f"\nIP段查询摘要")
-    print(f"{"="*50}")
+    print(f"{'='*50}")
     print(f"总查询数: {len(results)}")
-    print(f"成功查询: {len(successful)}")
-    print(f"查询失败: {len(failed)}")
+    print(f"成功查询: {successful}")
+    print(f"查询失败: {failed}")
     print(f"恶意IP: {malicious}")
     print(f"可疑IP: {suspicious}")
     print(f"清洁IP: {clean}")
 
     if successful:
-        malicious_pct = (malicious / len(successful)) * 100
+        malicious_pct = (malicious / successful) * 100
         print(f"恶意IP比例: {malicious_pct:.1f}%")
 
-    if failed and len(failed) <= 5:
+    if failed and failed <= 5:
         print(f"\n失败详情:")
-        for failure in failed:
+        for failure in failures:
             ip = failure.get('ip', failure.get('ip_range', 'N/A'))
             error = failure.get('error', '未知错误')
             print(f"   {ip}: {error}")
@@ -158,6 +198,8 @@ def main():
     # 覆盖配置
     if args.api_key:
         config.update('threat_intel.abuseipdb_api_key', args.api_key)
+    if args.concurrency is not None:
+        config.update('threat_intel.concurrency', args.concurrency)
 
     # 创建客户端
     client = ThreatIntelClient(config)
@@ -170,15 +212,18 @@ def main():
         sys.exit(1)
 
     # 执行查询
-    if args.ip:
-        print(f"查询单个IP: {args.ip}")
-        result = client.check_ip(args.ip)
-        print_result(result, args.verbose)
-
-    elif args.ip_range:
-        print(f"查询IP段: {args.ip_range}")
-        results = client.check_ip_range(args.ip_range)
-        print_range_summary(results)
+    try:
+        if args.ip:
+            print(f"查询单个IP: {args.ip}")
+            result = client.check_ip(args.ip)
+            print_result(result, args.verbose)
+
+        elif args.ip_range:
+            print(f"查询IP段: {args.ip_range}")
+            results = client.check_ip_range(args.ip_range)
+            print_range_summary(results)
+    finally:
+        client.close()
 
     # 查询时间
     print(f"\n查询完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -4,10 +4,16 @@ IP地址处理工具
 提供IP地址分类、解析等功能
 """
 import ipaddress
+import socket
 from typing import Tuple, Optional
 from enum import Enum
 
 
+# IPv4首字节快速分类：这些首字节下存在细分的特殊地址段（各Python版本的is_private定义略有差异），
+# 交给ipaddress判断；其余首字节可直接按整段确定分类
+_IPV4_SPECIAL_FIRST_OCTETS = frozenset([0, 100, 169, 172, 192, 198, 203, *range(240, 256)])
+
+
 class IPType(Enum):
     """IP地址类型枚举"""
     IPV4 = "IPv4"
@@ -46,6 +52,9 @@ class IPClassifier:
         '8000': 'HTTP-Dev',
     }
 
+    # 常见服务端口集合（供成员判断使用）
+    COMMON_PORTS_SET = frozenset(COMMON_PORTS)
+
     # 高危端口
     HIGH_RISK_PORTS = {
         '445': 'SMB',
@@ -56,6 +65,9 @@ class IPClassifier:
         '69': 'TFTP',
     }
 
+    # 高危端口集合（供成员判断使用）
+    HIGH_RISK_PORTS_SET = frozenset(HIGH_RISK_PORTS)
+
     @staticmethod
     def parse_ip(ip_str: str) -> Tuple[IPType, Optional[ipaddress.IPv4Address],
                                        Optional[ipaddress.IPv6Address]]:
@@ -91,27 +103,51 @@ class IPClassifier:
         Returns:
             IP地址分类
         """
+        return IPClassifier.classify_ip(ip_str)[1]
+
+    @staticmethod
+    def classify_ip(ip_str: str) -> Tuple[Optional[IPType], IPCategory]:
+        """
+        解析并分类IP地址（只构造一次地址对象，同时得到类型与分类）
+
+        Args:
+            ip_str: IP地址字符串
+
+        Returns:
+            (IP类型，无法解析时为None, IP地址分类)
+        """
+        if ':' not in ip_str:
+            # IPv4快速路径：inet_pton（C实现）校验格式，按首字节直接分类，不构造地址对象
+            try:
+                first_octet = socket.inet_pton(socket.AF_INET, ip_str)[0]
+            except (OSError, ValueError):
+                return None, IPCategory.UNKNOWN
+            if first_octet == 127:
+                return IPType.IPV4, IPCategory.LOOPBACK
+            if first_octet == 10:
+                return IPType.IPV4, IPCategory.PRIVATE
+            if 224 <= first_octet < 240:
+                return IPType.IPV4, IPCategory.MULTICAST
+            if first_octet not in _IPV4_SPECIAL_FIRST_OCTETS:
+                return IPType.IPV4, IPCategory.PUBLIC
+
         try:
             if ':' in ip_str:
                 addr = ipaddress.IPv6Address(ip_str)
-                if addr.is_loopback:
-                    return IPCategory.LOOPBACK
-                if addr.is_private:
-                    return IPCategory.PRIVATE
-                if addr.is_multicast:
-                    return IPCategory.MULTICAST
-                return IPCategory.PUBLIC
+                ip_type = IPType.IPV6
             else:
                 addr = ipaddress.IPv4Address(ip_str)
-                if addr.is_loopback:
-                    return IPCategory.LOOPBACK
-                if addr.is_private:
-                    return IPCategory.PRIVATE
-                if addr.is_multicast:
-                    return IPCategory.MULTICAST
-                return IPCategory.PUBLIC
+                ip_type = IPType.IPV4
         except ValueError:
-            return IPCategory.UNKNOWN
+            return None, IPCategory.UNKNOWN
+
+        if addr.is_loopback:
+            return ip_type, IPCategory.LOOPBACK
+        if addr.is_private:
+            return ip_type, IPCategory.PRIVATE
+        if addr.is_multicast:
+            return ip_type, IPCategory.MULTICAST
+        return ip_type, IPCategory.PUBLIC
 
     @staticmethod
     def is_internal(ip_str: str) -> bool:
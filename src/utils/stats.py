@@ -3,10 +3,21 @@
 
 提供各种统计分析功能
 """
+import re
 from typing import List, Dict, Any, Tuple
 from collections import Counter, defaultdict
 
 
+# 系统进程路径特征：一次正则扫描完成全部子串匹配
+_SYSTEM_PROCESS_PATTERN = re.compile(r'Windows|(?i:system32)')
+
+# 特权账户
+_PRIVILEGED_ACCOUNTS = frozenset([
+    'SYSTEM', 'NETWORK SERVICE', 'LOCAL SERVICE',
+    'NT AUTHORITY\\SYSTEM', 'NT AUTHORITY\\NETWORK SERVICE', 'NT AUTHORITY\\LOCAL SERVICE'
+])
+
+
 class StatsCalculator:
     """统计计算器"""
 
@@ -26,13 +37,14 @@ class StatsCalculator:
         获取出现频率最高的N项
 
         Args:
-            values: 值列表
+            values: 值列表，也可以是已统计好的Counter（直接复用，不再重新计数）
             top_n: 返回前N项
 
         Returns:
             (值, 计数)的列表，按计数降序排列
         """
-        counter = Counter(values)
+        counter = values if isinstance(values, Counter) else Counter(values)
+        # most_common(n) 内部即 heapq.nlargest，复杂度 O(n log top_n)，无需全量排序
         return counter.most_common(top_n)
 
     @staticmethod
@@ -81,7 +93,7 @@ class StatsCalculator:
             包含协议统计的字典
         """
         total = len(protocol_list)
-        distribution = StatsCalculator.get_distribution(protocol_list)
+        distribution = dict(Counter(protocol_list))
 
         stats = {
             'total': total,
@@ -111,15 +123,18 @@ class StatsCalculator:
             包含进程统计的字典
         """
         total = len(process_list)
-        top_processes = StatsCalculator.get_top_items(process_list, top_n)
+        # 只计数一次，唯一值数量与Top N都从同一个Counter得出
+        counter = Counter(process_list)
+        top_processes = StatsCalculator.get_top_items(counter, top_n)
 
-        # 区分系统进程和应用进程
-        system_count = sum(1 for p in process_list if p and ('Windows' in p or 'System32' in p.lower()))
+        # 区分系统进程和应用进程：按唯一进程路径判断一次，再按计数累加
+        is_system = _SYSTEM_PROCESS_PATTERN.search
+        system_count = sum(count for p, count in counter.items() if p and is_system(p))
         app_count = total - system_count
 
         stats = {
             'total': total,
-            'unique_count': StatsCalculator.count_unique(process_list),
+            'unique_count': len(counter),
             'top_processes': top_processes,
             'system_process_count': system_count,
             'application_process_count': app_count,
@@ -141,23 +156,18 @@ class StatsCalculator:
             包含用户统计的字典
         """
         total = len(user_list)
-        distribution = StatsCalculator.get_distribution(user_list)
-        top_users = StatsCalculator.get_top_items(user_list, 10)
-
-        # 识别特权账户
-        privileged_accounts = [
-            'SYSTEM', 'NETWORK SERVICE', 'LOCAL SERVICE',
-            'NT AUTHORITY\\SYSTEM', 'NT AUTHORITY\\NETWORK SERVICE', 'NT AUTHORITY\\LOCAL SERVICE'
-        ]
+        # 只计数一次，分布、唯一值数量与Top N都从同一个Counter得出
+        distribution = Counter(user_list)
+        top_users = StatsCalculator.get_top_items(distribution, 10)
+
+        # 识别特权账户：集合交集只留下实际出现过的特权账户
         privileged_count = sum(
-            distribution.get(user, 0)
-            for user in privileged_accounts
-            if user in distribution
+            distribution[user] for user in _PRIVILEGED_ACCOUNTS & distribution.keys()
         )
 
         stats = {
             'total': total,
-            'unique_count': StatsCalculator.count_unique(user_list),
+            'unique_count': len(distribution),
             'top_users': top_users,
             'privileged_count': privileged_count,
             'privileged_percentage': StatsCalculator.get_percentage(privileged_count, total),
@@ -179,26 +189,23 @@ class StatsCalculator:
         from .ip_utils import IPClassifier
 
         total = len(port_list)
-        distribution = StatsCalculator.get_distribution(port_list)
-        top_ports = StatsCalculator.get_top_items(port_list, 20)
+        # 只计数一次，分布、唯一值数量与Top N都从同一个Counter得出
+        counter = Counter(port_list)
+        distribution = dict(counter)
+        top_ports = StatsCalculator.get_top_items(counter, 20)
 
-        # 统计常见端口
+        # 统计常见端口与高危端口：集合交集只留下实际出现过的端口
         common_port_count = sum(
-            distribution.get(port, 0)
-            for port in IPClassifier.COMMON_PORTS.keys()
-            if port in distribution
+            distribution[port] for port in IPClassifier.COMMON_PORTS_SET & distribution.keys()
         )
-
-        # 统计高危端口
         high_risk_port_count = sum(
-            distribution.get(port, 0)
-            for port in IPClassifier.HIGH_RISK_PORTS.keys()
-            if port in distribution
+            distribution[port] for port in IPClassifier.HIGH_RISK_PORTS_SET & distribution.keys()
         )
 
         stats = {
             'total': total,
-            'unique_count': StatsCalculator.count_unique(port_list),
+            'distribution': distribution,
+            'unique_count': len(distribution),
             'top_ports': top_ports,
             'common_port_count': common_port_count,
             'common_port_percentage': StatsCalculator.get_percentage(common_port_count, total),
@@ -219,37 +226,36 @@ class StatsCalculator:
         Returns:
             包含IP统计的字典
         """
-        from .ip_utils import IPClassifier, IPType
+        from .ip_utils import IPClassifier, IPType, IPCategory
 
         total = len(ip_list)
-        unique_ips = StatsCalculator.count_unique(ip_list)
-        top_ips = StatsCalculator.get_top_items(ip_list, 20)
-
-        # 统计IPv4/IPv6分布
-        ip_types = []
-        categories = []
-        for ip in ip_list:
-            ip_type, ipv4, ipv6 = IPClassifier.parse_ip(ip)
-            ip_types.append(ip_type.value if ipv4 or ipv6 else 'unknown')
-            categories.append(IPClassifier.categorize_ip(ip).value)
-
-        type_distribution = StatsCalculator.get_distribution(ip_types)
-        category_distribution = StatsCalculator.get_distribution(categories)
+        # 只计数一次，唯一值数量与Top N都从同一个Counter得出
+        counter = Counter(ip_list)
+        unique_ips = len(counter)
+        top_ips = StatsCalculator.get_top_items(counter, 20)
+
+        # 统计IPv4/IPv6分布：每个唯一IP只解析一次，按出现次数累加，不再构建中间列表
+        type_distribution = Counter()
+        category_distribution = Counter()
+        classify_ip = IPClassifier.classify_ip
+        for ip, count in counter.items():
+            ip_type, category = classify_ip(ip)
+            type_distribution[ip_type] += count
+            category_distribution[category] += count
+
+        internal_count = category_distribution[IPCategory.PRIVATE]
+        external_count = category_distribution[IPCategory.PUBLIC]
 
         stats = {
             'total': total,
             'unique_count': unique_ips,
             'top_ips': top_ips,
-            'ipv4_count': type_distribution.get('IPv4', 0),
-            'ipv6_count': type_distribution.get('IPv6', 0),
-            'internal_count': category_distribution.get('内网IP', 0),
-            'external_count': category_distribution.get('外网IP', 0),
-            'internal_percentage': StatsCalculator.get_percentage(
-                category_distribution.get('内网IP', 0), total
-            ),
-            'external_percentage': StatsCalculator.get_percentage(
-                category_distribution.get('外网IP', 0), total
-            ),
+            'ipv4_count': type_distribution[IPType.IPV4],
+            'ipv6_count': type_distribution[IPType.IPV6],
+            'internal_count': internal_count,
+            'external_count': external_count,
+            'internal_percentage': StatsCalculator.get_percentage(internal_count, total),
+            'external_percentage': StatsCalculator.get_percentage(external_count, total),
         }
 
         return stats
@@ -265,27 +271,28 @@ class StatsCalculator:
         Returns:
             包含域名统计的字典
         """
-        # 过滤空域名
-        filtered = StatsCalculator.filter_empty_values(domain_list)
+        # 计数一次，空值（None/''）直接从计数中剔除，无需另建过滤后的列表
+        total = len(domain_list)
+        counter = Counter(domain_list)
+        empty_count = counter.pop(None, 0) + counter.pop('', 0)
+        non_empty = total - empty_count
 
-        if not filtered:
+        if not non_empty:
             return {
-                'total': len(domain_list),
+                'total': total,
                 'non_empty_count': 0,
-                'empty_count': len(domain_list),
+                'empty_count': total,
                 'unique_count': 0,
                 'top_domains': [],
             }
 
-        total = len(domain_list)
-        non_empty = len(filtered)
-        top_domains = StatsCalculator.get_top_items(filtered, 10)
+        top_domains = StatsCalculator.get_top_items(counter, 10)
 
         stats = {
             'total': total,
             'non_empty_count': non_empty,
-            'empty_count': total - non_empty,
-            'unique_count': StatsCalculator.count_unique(filtered),
+            'empty_count': empty_count,
+            'unique_count': len(counter),
             'top_domains': top_domains,
         }
 
@@ -6,9 +6,53 @@
 from datetime import datetime, time
 from typing import List, Dict, Any
 from collections import Counter
+from functools import lru_cache
 from dateutil import parser as date_parser
 
 
+# 按小时（0-23）索引的时间段：0-6凌晨、6-12上午、12-18下午、18-22傍晚、22-24深夜
+_PERIOD_BY_HOUR = ("凌晨",) * 6 + ("上午",) * 6 + ("下午",) * 6 + ("傍晚",) * 4 + ("深夜",) * 2
+
+# 时长单位（秒数阈值, 单位），按阈值从大到小排列，不足1分钟时按秒显示
+_DURATION_UNITS = ((86400, "天"), (3600, "小时"), (60, "分钟"))
+
+
+@lru_cache(maxsize=100_000)
+def _parse_timestamp(timestamp: str) -> datetime:
+    """
+    解析时间戳（带缓存，同一时间戳在多次统计中只解析一次）
+
+    Args:
+        timestamp: 时间戳字符串
+
+    Returns:
+        datetime对象
+
+    Raises:
+        ValueError: 所有格式均无法解析（异常不会被缓存）
+    """
+    # ISO 8601快速路径：fromisoformat为C实现，比dateutil快一个数量级
+    try:
+        if timestamp.endswith('Z'):
+            return datetime.fromisoformat(timestamp[:-1] + '+00:00')
+        return datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError, AttributeError):
+        pass
+
+    try:
+        # 尝试使用dateutil解析（支持多种格式）
+        return date_parser.parse(timestamp)
+    except Exception:
+        # 回退到ISO格式解析
+        try:
+            # 处理不同的ISO 8601变体
+            timestamp = timestamp.replace('+08:00', '+0800')
+            timestamp = timestamp.replace(':', '')
+            return datetime.strptime(timestamp, TimeParser.ISO_FORMAT)
+        except Exception:
+            raise ValueError(timestamp)
+
+
 class TimeParser:
     """时间解析器"""
 
@@ -27,18 +71,13 @@ class TimeParser:
             datetime对象
         """
         try:
-            # 尝试使用dateutil解析（支持多种格式）
-            return date_parser.parse(timestamp)
-        except Exception:
-            # 回退到ISO格式解析
-            try:
-                # 处理不同的ISO 8601变体
-                timestamp = timestamp.replace('+08:00', '+0800')
-                timestamp = timestamp.replace(':', '')
-                return datetime.strptime(timestamp, TimeParser.ISO_FORMAT)
-            except Exception:
-                print(f"警告: 无法解析时间戳: {timestamp}")
-                return datetime.now()
+            return _parse_timestamp(timestamp)
+        except ValueError as e:
+            print(f"警告: 无法解析时间戳: {e}")
+            return datetime.now()
+        except TypeError:
+            print(f"警告: 无法解析时间戳: {timestamp}")
+            return datetime.now()
 
     @staticmethod
     def format(dt: datetime, fmt: str = "%Y-%m-%d %H:%M:%S") -> str:
@@ -119,21 +158,7 @@ class TimeParser:
         Returns:
             时间段字符串: "凌晨"、"上午"、"下午"、"傍晚"、"深夜"
         """
-        hour = dt.hour
-        if 0 <= hour < 6:
-            return "凌晨"
-        elif 6 <= hour < 9:
-            return "上午"
-        elif 9 <= hour < 12:
-            return "上午"
-        elif 12 <= hour < 14:
-            return "下午"
-        elif 14 <= hour < 18:
-            return "下午"
-        elif 18 <= hour < 22:
-            return "傍晚"
-        else:
-            return "深夜"
+        return _PERIOD_BY_HOUR[dt.hour]
 
     @staticmethod
     def get_time_range(timestamps: List[str]) -> Dict[str, Any]:
@@ -155,8 +180,11 @@ class TimeParser:
             }
 
         parsed = [TimeParser.parse(ts) for ts in timestamps]
-        start = min(parsed)
-        end = max(parsed)
+        return TimeParser._build_time_range(min(parsed), max(parsed))
+
+    @staticmethod
+    def _build_time_range(start: datetime, end: datetime) -> Dict[str, Any]:
+        """根据起止时间构建时间范围信息"""
         duration = end - start
 
         return {
@@ -169,6 +197,60 @@ class TimeParser:
             'duration_days': duration.total_seconds() / 86400,
         }
 
+    @staticmethod
+    def summarize(timestamps: List[str]) -> Dict[str, Any]:
+        """
+        一次遍历完成全部时间统计（每个时间戳只解析一次）
+
+        结果与分别调用 get_time_range、get_hour_distribution、get_date_distribution、
+        get_time_period_distribution 以及 len(get_abnormal_time_connections) 相同。
+
+        Args:
+            timestamps: 时间戳列表
+
+        Returns:
+            包含 time_range、hour_distribution、date_distribution、
+            period_distribution、abnormal_time_count 的字典
+        """
+        parse = TimeParser.parse
+        get_date = TimeParser.get_date
+        period_by_hour = _PERIOD_BY_HOUR
+        abnormal_table = _ABNORMAL_BY_WEEKDAY_HOUR
+
+        hour_counter = Counter()
+        date_counter = Counter()
+        period_counter = Counter()
+        abnormal_count = 0
+        start = end = None
+
+        for ts in timestamps:
+            dt = parse(ts)
+            hour = dt.hour
+            hour_counter[hour] += 1
+            date_counter[get_date(dt)] += 1
+            period_counter[period_by_hour[hour]] += 1
+            # 查表代替夜间/周末/工作时间的逐项判断，布尔值直接累加
+            abnormal_count += abnormal_table[dt.weekday() * 24 + hour]
+            if start is None:
+                start = end = dt
+            elif dt < start:
+                start = dt
+            elif dt > end:
+                end = dt
+
+        if start is None:
+            time_range = TimeParser.get_time_range([])
+        else:
+            time_range = TimeParser._build_time_range(start, end)
+
+        return {
+            'time_range': time_range,
+            'hour_distribution': dict(hour_counter),
+            'date_distribution': dict(date_counter),
+            'period_distribution': dict(period_counter),
+            'abnormal_time_count': abnormal_count,
+        }
+
     @staticmethod
     def get_hour_distribution(timestamps: List[str]) -> Dict[int, int]:
         """
@@ -211,6 +293,26 @@ class TimeParser:
         periods = [TimeParser.get_time_period(TimeParser.parse(ts)) for ts in timestamps]
         return dict(Counter(periods))
 
+    @staticmethod
+    def is_abnormal_time(dt: datetime) -> bool:
+        """
+        判断是否为非正常时间（夜间、周末工作时间）
+
+        Args:
+            dt: datetime对象
+
+        Returns:
+            True if 非正常时间, False otherwise
+        """
+        return _ABNORMAL_BY_WEEKDAY_HOUR[dt.weekday() * 24 + dt.hour]
+
+    @staticmethod
+    def _is_abnormal_time_slow(dt: datetime) -> bool:
+        """逐项判断是否为非正常时间（用于生成查表，判定规则以此为准）"""
+        if TimeParser.is_night_time(dt):
+            return True
+        return TimeParser.is_weekend(dt) and TimeParser.is_working_hours(dt)
+
     @staticmethod
     def get_abnormal_time_connections(timestamps: List[str]) -> List[str]:
         """
@@ -222,14 +324,7 @@ class TimeParser:
         Returns:
             非正常时间（夜间、周末工作时间）的时间戳列表
         """
-        abnormal = []
-        for ts in timestamps:
-            dt = TimeParser.parse(ts)
-            if TimeParser.is_night_time(dt):
-                abnormal.append(ts)
-            elif TimeParser.is_weekend(dt) and TimeParser.is_working_hours(dt):
-                abnormal.append(ts)
-        return abnormal
+        return [ts for ts in timestamps if TimeParser.is_abnormal_time(TimeParser.parse(ts))]
 
     @staticmethod
     def format_duration(seconds: float) -> str:
@@ -242,14 +337,15 @@ class TimeParser:
         Returns:
             格式化的时长字符串
         """
-        if seconds < 60:
-            return f"{seconds:.1f}秒"
-        elif seconds < 3600:
-            minutes = seconds / 60
-            return f"{minutes:.1f}分钟"
-        elif seconds < 86400:
-            hours = seconds / 3600
-            return f"{hours:.1f}小时"
-        else:
-            days = seconds / 86400
-            return f"{days:.1f}天"
+        for threshold, unit in _DURATION_UNITS:
+            if seconds >= threshold:
+                return f"{seconds / threshold:.1f}{unit}"
+        return f"{seconds:.1f}秒"
+
+
+# 按 weekday*24+hour 索引的非正常时间表（由逐项判断规则生成，2024-01-01为周一）
+_ABNORMAL_BY_WEEKDAY_HOUR = tuple(
+    TimeParser._is_abnormal_time_slow(datetime(2024, 1, 1 + weekday, hour))
+    for weekday in range(7)
+    for hour in range(24)
+)
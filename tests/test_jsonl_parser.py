@@ -0,0 +1,64 @@
+"""
+JSONL解析器测试
+"""
+import pytest
+
+from src.jsonl_parser import JSONLParser
+
+
+@pytest.mark.parametrize('validate', [True, False])
+def test_non_object_lines_are_dropped(tmp_path, validate):
+    """合法JSON但不是对象的行不应产出，且记录为解析错误"""
+    path = tmp_path / "log.jsonl"
+    path.write_text(
+        '{"timestamp": "2026-01-01T10:00:00", "dest_ip": "8.8.8.8"}\n'
+        '[1, 2]\n'
+        '"x"\n'
+        '3\n',
+        encoding='utf-8',
+    )
+
+    parser = JSONLParser()
+    records = list(parser.iter_records(str(path), validate=validate))
+
+    assert all(isinstance(record, dict) for record in records)
+    assert len(records) == (0 if validate else 1)
+    not_object_errors = [e for e in parser.errors if '不是JSON对象' in e]
+    assert [e.split(':')[0] for e in not_object_errors] == ['第2行', '第3行', '第4行']
+
+
+def test_process_pool_matches_serial_parsing(tmp_path, monkeypatch, capsys):
+    """多进程解析与逐个解析得到相同的记录、错误与按文件顺序的输出"""
+    from src import jsonl_parser
+
+    file_paths = []
+    for i in range(3):
+        path = tmp_path / f"log{i}.jsonl"
+        lines = [
+            '{"timestamp": "2026-01-01T10:00:00", "source": "s", "process": "p%d", '
+            '"dest_ip": "8.8.8.%d", "dest_port": "443", "user": "u"}' % (i, n)
+            for n in range(50)
+        ]
+        lines.append('[1, 2]')
+        path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        file_paths.append(str(path))
+
+    serial = JSONLParser().parse_multiple_files(file_paths, validate=False)
+    serial_output = capsys.readouterr().out
+
+    monkeypatch.setattr(jsonl_parser, '_PARALLEL_MIN_BYTES', 0)
+    monkeypatch.setattr(jsonl_parser.os, 'cpu_count', lambda: 2)
+    submitted = []
+
+    class _RecordingPool(jsonl_parser.ProcessPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            submitted.append(args[0])
+            return super().submit(fn, *args, **kwargs)
+
+    monkeypatch.setattr(jsonl_parser, 'ProcessPoolExecutor', _RecordingPool)
+    pooled = JSONLParser().parse_multiple_files(file_paths, validate=False)
+    pooled_output = capsys.readouterr().out
+
+    assert submitted == file_paths
+    assert pooled == serial
+    assert pooled_output == serial_output
@@ -0,0 +1,54 @@
+"""
+日志分析器测试
+"""
+import pytest
+
+from src.config import Config
+from src import log_analyzer
+from src.log_analyzer import LogAnalyzer
+
+
+def _write_config(tmp_path) -> str:
+    """写入启用威胁情报并配置磁盘缓存的配置文件"""
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "threat_intel:\n"
+        "  enabled: true\n"
+        "  abuseipdb_api_key: test-key\n"
+        f"  cache_dir: {tmp_path / 'ti_cache'}\n",
+        encoding='utf-8',
+    )
+    return str(path)
+
+
+def test_no_cache_override_reaches_threat_intel_client(tmp_path, monkeypatch):
+    """--no-cache 写入的配置覆盖需传递到分析阶段创建的威胁情报客户端"""
+    clients = []
+
+    class _RecordingAnalyzer:
+        def __init__(self, client):
+            clients.append(client)
+
+        def analyze_ips(self, ips):
+            return {'summary': {}, 'malicious_ips': [], 'suspicious_ips': []}
+
+    monkeypatch.setattr(log_analyzer, 'ThreatIntelAnalyzer', _RecordingAnalyzer)
+
+    config = Config(_write_config(tmp_path))
+    config.update('threat_intel.cache_dir', '')
+
+    records = [{
+        'timestamp': '2026-01-01T10:00:00+08:00',
+        'process': 'C:\\app.exe',
+        'user': 'alice',
+        'dest_ip': '8.8.8.8',
+        'dest_port': '443',
+        'protocol': 'tcp',
+    }]
+    LogAnalyzer(config).analyze_with_threat_intel(records)
+
+    assert len(clients) == 1
+    assert not clients[0].cache_dir
+    # 查询结束后客户端已关闭，线程池不再接受任务
+    with pytest.raises(RuntimeError):
+        clients[0]._executor.submit(int)
@@ -0,0 +1,75 @@
+"""
+威胁情报客户端测试
+"""
+import threading
+
+import pytest
+
+from src import threat_intel_client
+from src.config import Config
+from src.threat_intel_client import ThreatIntelClient, ThreatIntelAnalyzer
+
+
+def _make_client(tmp_path, concurrency: int, rate: int = 10) -> ThreatIntelClient:
+    """创建不落盘缓存的威胁情报客户端"""
+    path = tmp_path / "config.yaml"
+    path.write_text(
+        "threat_intel:\n"
+        "  enabled: true\n"
+        "  abuseipdb_api_key: test-key\n"
+        "  cache_dir: ''\n"
+        f"  concurrency: {concurrency}\n"
+        f"  rate_limit_per_second: {rate}\n",
+        encoding='utf-8',
+    )
+    return ThreatIntelClient(Config(str(path)))
+
+
+def test_analyze_ips_queries_concurrently(tmp_path, monkeypatch):
+    """analyze_ips 去重过滤后并发查询，结果保持输入顺序"""
+    ips = ['8.8.8.8', '1.1.1.1', '10.0.0.1', '8.8.8.8', '9.9.9.9', '4.4.4.4']
+    expected = ['8.8.8.8', '1.1.1.1', '9.9.9.9', '4.4.4.4']
+
+    client = _make_client(tmp_path, concurrency=len(expected))
+    # 串行查询时第一个调用就会在屏障处等待超时
+    barrier = threading.Barrier(len(expected), timeout=5)
+    queried = []
+
+    def fake_check_ip(ip):
+        queried.append(ip)
+        barrier.wait()
+        return {'success': True, 'ip': ip, 'data': {'abuseConfidenceScore': 0}}
+
+    monkeypatch.setattr(client, 'check_ip', fake_check_ip)
+
+    results = ThreatIntelAnalyzer(client).analyze_ips(ips)
+
+    assert sorted(queried) == sorted(expected)
+    assert [item['ip'] for item in results['clean_ips']] == expected
+    assert results['summary']['total_queried'] == len(expected)
+
+
+def test_rate_limit_enforced_with_ample_quota(tmp_path, monkeypatch):
+    """剩余配额充足时仍按本地滑动窗口限速"""
+    sleeps = []
+    monkeypatch.setattr(threat_intel_client.time, 'sleep', sleeps.append)
+
+    client = _make_client(tmp_path, concurrency=1, rate=2)
+    client._quota_remaining = 5000
+    for _ in range(3):
+        client._wait_for_rate_limit()
+
+    # 窗口容量为2，第3个请求必须等待最早一次滑出1秒窗口
+    assert len(sleeps) == 1
+    assert 0 < sleeps[0] <= 1.0
+
+
+def test_non_positive_concurrency_falls_back_to_one_worker(tmp_path):
+    """concurrency 配置为0时按1个线程处理，close() 后线程池不再接受任务"""
+    client = _make_client(tmp_path, concurrency=0)
+    client.check_ip = lambda ip: {'success': True, 'ip': ip, 'data': {}}
+    assert [r['ip'] for r in client.check_ips(['8.8.8.8', '1.1.1.1'])] == ['8.8.8.8', '1.1.1.1']
+
+    client.close()
+    with pytest.raises(RuntimeError):
+        client._executor.submit(int)